@@ -0,0 +1,267 @@
+# anomaly_detector.py
+
+import json
+import logging
+import itertools
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timedelta
+from metrics import METRICS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Minutes a record may arrive after later ones and still count towards its own minute
+LATENESS_MINUTES = 1
+
+# Closed minutes the 4xx/5xx rate of a minute is compared with, and how many must be seen first
+WINDOW_MINUTES = 60
+MIN_HISTORY_MINUTES = 5
+
+# A minute's 4xx or 5xx rate is anomalous above mean + RATE_Z standard deviations,
+# counting both the window's spread and the minute's own sampling noise, if it is
+# also RATE_MIN_INCREASE above the mean and the minute had at least
+# MIN_MINUTE_REQUESTS requests
+RATE_Z = 4.0
+RATE_MIN_INCREASE = 0.1
+MIN_MINUTE_REQUESTS = 50
+
+# An IP is anomalous with at least IP_MIN_REQUESTS requests in a minute and
+# IP_SPIKE_FACTOR times its own average
+IP_MIN_REQUESTS = 300
+IP_SPIKE_FACTOR = 5.0
+
+# A path is anomalous with at least PATH_MIN_REQUESTS requests in a minute,
+# at least PATH_ERROR_RATIO of them 5xx, and PATH_RATIO_MARGIN above its own average
+PATH_MIN_REQUESTS = 20
+PATH_ERROR_RATIO = 0.5
+PATH_RATIO_MARGIN = 0.25
+
+# Weight of the latest minute in the per-key averages
+EWMA_ALPHA = 0.2
+
+# Keys without requests for this many minutes are dropped, and at most this many are kept
+IDLE_MINUTES = 15
+MAX_KEYS = 200000
+
+# Minute strings converted to minute numbers, cleared when it gets this big
+MINUTE_CACHE_SIZE = 10000
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Fields of _KeyWindows state lists
+_MINUTE, _COUNT, _ERRORS, _MEAN_COUNT, _MEAN_RATIO, _ALERTED = range(6)
+
+
+def _minute_text(minute):
+    return (_EPOCH + timedelta(minutes=minute)).strftime('%Y-%m-%d %H:%M:00')
+
+
+class _KeyWindows:
+    """Per-key counts of the current minute and exponentially weighted averages of earlier ones.
+
+    Each key holds one fixed-size list, kept in least recently updated
+    order, so idle keys are evicted from the front in amortised O(1).
+    """
+
+    def __init__(self, idle_minutes=IDLE_MINUTES, max_keys=MAX_KEYS):
+        self.idle_minutes = idle_minutes
+        self.max_keys = max_keys
+        self.keys = OrderedDict()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key, minute, count, errors=0):
+        """Adds a minute's requests (and errors) for a key; returns the key's state list."""
+        state = self.keys.get(key)
+        if state is None:
+            state = self.keys[key] = [minute, 0, 0, 0.0, 0.0, None]
+        else:
+            self.keys.move_to_end(key)
+            if minute > state[_MINUTE]:
+                # Fold the finished minute into the averages; minutes without requests count as zero
+                decay = (1 - EWMA_ALPHA) ** (minute - state[_MINUTE] - 1)
+                state[_MEAN_COUNT] = ((1 - EWMA_ALPHA) * state[_MEAN_COUNT] + EWMA_ALPHA * state[_COUNT]) * decay
+                if state[_COUNT]:
+                    state[_MEAN_RATIO] += EWMA_ALPHA * (state[_ERRORS] / state[_COUNT] - state[_MEAN_RATIO])
+                state[_MINUTE], state[_COUNT], state[_ERRORS] = minute, 0, 0
+        # Late records for an earlier minute are added to the key's current one
+        state[_COUNT] += count
+        state[_ERRORS] += errors
+        return state
+
+    def evict(self, watermark):
+        """Drops keys idle since before watermark - idle_minutes, and the oldest beyond max_keys."""
+        keys = self.keys
+        oldest = watermark - self.idle_minutes
+        while keys:
+            key, state = next(iter(keys.items()))
+            if state[_MINUTE] >= oldest and len(keys) <= self.max_keys:
+                break
+            del keys[key]
+
+
+class AnomalyDetector:
+    """Detects traffic anomalies in parsed LogRecords as they are ingested, without querying log_entries.
+
+    Time is the records' own: a minute is closed once records more than
+    LATENESS_MINUTES later have arrived. Closed minutes' 4xx and 5xx rates
+    are compared with the last WINDOW_MINUTES minutes. Per-IP request counts
+    and per-path 5xx ratios are checked as each batch arrives, against each
+    key's own exponentially weighted average, and alert at most once per key
+    and minute. Records are counted per minute group with Counter, so the
+    per-record cost is a few C-level dictionary updates.
+
+    Alerts are dicts passed in lists to sink, and logged.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.watermark = None
+        self.late_records = 0
+        self._open = {}                 # minute -> [requests, 4xx, 5xx]
+        self._history = deque(maxlen=WINDOW_MINUTES)
+        self._ips = _KeyWindows()
+        self._paths = _KeyWindows()
+        self._minutes = {}
+
+    def _minute(self, text):
+        """'YYYY-MM-DD HH:MM' -> minutes since the epoch, cached per string."""
+        minute = self._minutes.get(text)
+        if minute is None:
+            if len(self._minutes) >= MINUTE_CACHE_SIZE:
+                self._minutes.clear()
+            minute = self._minutes[text] = int((datetime.strptime(text, '%Y-%m-%d %H:%M') - _EPOCH).total_seconds()) // 60
+        return minute
+
+    @staticmethod
+    def _alert(kind, minute, subject, value, baseline, requests):
+        return {
+            'detected_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'minute': _minute_text(minute),
+            'kind': kind,
+            'subject': subject,
+            'value': round(value, 4),
+            'baseline': round(baseline, 4) if baseline is not None else None,
+            'requests': requests,
+        }
+
+    def observe(self, records):
+        """Feeds a batch of LogRecords; returns the alerts it raised, after passing them to the sink."""
+        alerts = []
+        for minute_text, group in itertools.groupby(records, key=lambda record: record.timestamp[:16]):
+            group = list(group)
+            minute = self._minute(minute_text)
+            if self.watermark is None or minute > self.watermark:
+                self.watermark = minute
+                self._close_minutes(self.watermark - LATENESS_MINUTES, alerts)
+                self._ips.evict(self.watermark)
+                self._paths.evict(self.watermark)
+
+            statuses = Counter(record.status_code // 100 for record in group)
+            if minute >= self.watermark - LATENESS_MINUTES:
+                counts = self._open.setdefault(minute, [0, 0, 0])
+                counts[0] += len(group)
+                counts[1] += statuses[4]
+                counts[2] += statuses[5]
+            else:
+                self.late_records += len(group)
+
+            for ip, count in Counter(record.ip_address for record in group).items():
+                state = self._ips.add(ip, minute, count)
+                if (state[_COUNT] >= IP_MIN_REQUESTS and state[_COUNT] > IP_SPIKE_FACTOR * state[_MEAN_COUNT]
+                        and state[_ALERTED] != state[_MINUTE]):
+                    state[_ALERTED] = state[_MINUTE]
+                    alerts.append(self._alert('ip_request_rate', state[_MINUTE], ip, state[_COUNT],
+                                              state[_MEAN_COUNT], state[_COUNT]))
+
+            paths = Counter(record.path for record in group)
+            errors = Counter(record.path for record in group if record.status_code >= 500) if statuses[5] else {}
+            for path, count in paths.items():
+                state = self._paths.add(path, minute, count, errors.get(path, 0))
+                if state[_COUNT] < PATH_MIN_REQUESTS or state[_ALERTED] == state[_MINUTE]:
+                    continue
+                ratio = state[_ERRORS] / state[_COUNT]
+                if ratio >= PATH_ERROR_RATIO and ratio >= state[_MEAN_RATIO] + PATH_RATIO_MARGIN:
+                    state[_ALERTED] = state[_MINUTE]
+                    alerts.append(self._alert('path_error_ratio', state[_MINUTE], path, ratio,
+                                              state[_MEAN_RATIO], state[_COUNT]))
+
+        self._emit(alerts)
+        return alerts
+
+    def _close_minutes(self, before, alerts):
+        """Checks the 4xx/5xx rates of the open minutes before minute `before` and moves them to the window."""
+        for minute in sorted(m for m in self._open if m < before):
+            requests, client_errors, server_errors = self._open.pop(minute)
+            rates = (client_errors / requests, server_errors / requests)
+            if requests >= MIN_MINUTE_REQUESTS and len(self._history) >= MIN_HISTORY_MINUTES:
+                for i, kind in enumerate(('status_4xx_rate', 'status_5xx_rate')):
+                    window = [history[i] for history in self._history]
+                    mean = sum(window) / len(window)
+                    variance = sum((rate - mean) ** 2 for rate in window) / len(window)
+                    # A minute of few requests swings more than the window average suggests
+                    std = (variance + mean * (1 - mean) / requests) ** 0.5
+                    if rates[i] > mean + RATE_Z * std and rates[i] >= mean + RATE_MIN_INCREASE:
+                        alerts.append(self._alert(kind, minute, None, rates[i], mean, requests))
+            if requests >= MIN_MINUTE_REQUESTS:
+                self._history.append(rates)
+
+    def observe_batches(self, batches):
+        """Yields batches unchanged after observing each one, for use between the reader and the writers."""
+        for batch in batches:
+            self.observe(batch)
+            yield batch
+
+    def close(self):
+        """Closes every open minute at the end of the input, emitting any last alerts, and closes the sink."""
+        alerts = []
+        if self.watermark is not None:
+            self._close_minutes(self.watermark + 1, alerts)
+        self._emit(alerts)
+        if hasattr(self.sink, 'close'):
+            self.sink.close()
+        if self.late_records:
+            logging.info(f"Anomaly detection: {self.late_records} records arrived more than "
+                         f"{LATENESS_MINUTES} minute(s) late and were left out of the 4xx/5xx rates")
+
+    def _emit(self, alerts):
+        if not alerts:
+            return
+        for alert in alerts:
+            METRICS.inc('anomalies_total', kind=alert['kind'])
+            subject = f" {alert['subject']}" if alert['subject'] is not None else ''
+            logging.warning(f"Anomaly at {alert['minute']}: {alert['kind']}{subject} = {alert['value']} "
+                            f"(baseline {alert['baseline']}, {alert['requests']} requests)")
+        if self.sink is not None:
+            try:
+                self.sink(alerts)
+            except Exception as e:
+                logging.error(f"Could not record {len(alerts)} anomalies: {e}")
+
+
+class JsonlAnomalySink:
+    """Appends alerts to a JSON Lines file, one write per batch of alerts."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, alerts):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(alert) + '\n' for alert in alerts))
+
+    def close(self):
+        """Nothing is held open between writes."""
+
+
+class TableAnomalySink:
+    """Inserts alerts into the anomalies table on a connection of its own, so writers are not disturbed."""
+
+    def __init__(self, db_handler):
+        self.db_handler = db_handler.clone()
+
+    def __call__(self, alerts):
+        self.db_handler.record_anomalies(alerts)
+
+    def close(self):
+        self.db_handler.close_clone()
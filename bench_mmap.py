@@ -0,0 +1,85 @@
+# bench_mmap.py
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import resource
+import subprocess
+
+# Sample log shipped with the project, used when no file is given
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'Project-1 log analysis and report', 'sample_logs', 'access.log')
+
+
+def run_text(file_path, batch_size):
+    """The default path: chunked text decoding and parse_line on each line."""
+    from log_sources import LogSource
+    from log_parser import LogParser
+
+    log_parser = LogParser()
+    rows, batch = 0, []
+    for line in LogSource(file_path):
+        parsed = log_parser.parse_line(line)
+        if parsed:
+            batch.append(parsed)
+            if len(batch) >= batch_size:
+                rows += len(batch)
+                batch = []
+    return rows + len(batch)
+
+
+def run_mmap(file_path, batch_size):
+    """The --mmap path: bytes regex over a memory map."""
+    from mmap_parser import MmapLogReader
+    return sum(len(batch) for batch in MmapLogReader().iter_batches(file_path, batch_size))
+
+
+PATHS = {'text': run_text, 'mmap': run_mmap}
+
+
+def measure(path, file_path, batch_size):
+    """Runs one path in this process and prints its rows, seconds and peak RSS as JSON."""
+    logging.disable(logging.WARNING)
+    started = time.perf_counter()
+    rows = PATHS[path](file_path, batch_size)
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in KB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({'rows': rows, 'seconds': elapsed, 'peak_rss_mb': peak_rss_mb}))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the mmap parser against the default text path")
+    arg_parser.add_argument('file_path', nargs='?', default=SAMPLE_LOG,
+                            help='Uncompressed log file (default: the bundled sample log)')
+    arg_parser.add_argument('--batch_size', type=int, default=1000, help='Entries per batch')
+    arg_parser.add_argument('--measure', choices=PATHS, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.measure:
+        measure(args.measure, args.file_path, args.batch_size)
+        return
+
+    size_mb = os.path.getsize(args.file_path) / 1048576
+    print(f"{args.file_path}: {size_mb:.1f} MB")
+    results = {}
+    for path in PATHS:
+        # A fresh process per path, so peak RSS is not inherited from the other run
+        output = subprocess.run(
+            [sys.executable, __file__, args.file_path, '--batch_size', str(args.batch_size), '--measure', path],
+            capture_output=True, text=True, check=True
+        ).stdout
+        result = results[path] = json.loads(output.strip().splitlines()[-1])
+        print(f"{path:<6} {result['seconds']:8.3f}s  {result['rows'] / result['seconds']:10.0f} rows/sec  "
+              f"{size_mb / result['seconds']:7.1f} MB/s  peak RSS {result['peak_rss_mb']:7.1f} MB")
+
+    if results['text']['rows'] != results['mmap']['rows']:
+        print(f"Row counts differ: text {results['text']['rows']}, mmap {results['mmap']['rows']}")
+    print(f"Speedup: {results['text']['seconds'] / results['mmap']['seconds']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
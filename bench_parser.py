@@ -0,0 +1,54 @@
+# bench_parser.py
+
+import os
+import argparse
+import logging
+import time
+from log_parser import LogParser
+
+# Sample log shipped with the project, used when no file is given
+SAMPLE_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'Project-1 log analysis and report', 'sample_logs', 'access.log')
+
+
+def bench(label, parse, lines, repeat):
+    """Runs parse over every line `repeat` times and prints the best lines/sec."""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for line in lines:
+            parse(line)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    print(f"{label:<22} {best:8.3f}s  {len(lines) / best:12.0f} lines/sec")
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the fast-path parser against the regex parser")
+    arg_parser.add_argument('file_path', nargs='?', default=SAMPLE_LOG,
+                            help='Path to log file (default: the bundled sample log)')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='Runs per parser; the best one is reported')
+    args = arg_parser.parse_args()
+
+    # Malformed-line warnings would otherwise dominate the timings
+    logging.disable(logging.WARNING)
+
+    with open(args.file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        lines = f.readlines()
+
+    log_parser = LogParser()
+    mismatches = sum(1 for line in lines if log_parser.parse_line(line) != log_parser._parse_regex(line))
+    print(f"{len(lines)} lines, {mismatches} mismatches between fast path and regex")
+
+    regex_time = bench('regex + strptime', log_parser._parse_regex, lines, args.repeat)
+    if not log_parser.fast_path:
+        print("Fast path disabled in config.ini ([log] fast_path = yes to enable)")
+        return
+    fast_time = bench('fast path', log_parser.parse_line, lines, args.repeat)
+    print(f"Speedup: {regex_time / fast_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
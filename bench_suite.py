@@ -0,0 +1,271 @@
+# bench_suite.py
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import itertools
+import tempfile
+import subprocess
+import configparser
+from datetime import datetime, timezone
+from tabulate import tabulate
+from log_parser import LogParser
+from log_sources import LogSource, SourceBatch, SourceFile, detect_compression, file_fingerprint
+from ua_classifier import UserAgentClassifier
+from synthetic_logs import (SyntheticLogs, DEFAULT_IPS, DEFAULT_PATHS, DEFAULT_USER_AGENTS,
+                            DEFAULT_REFERRERS, DEFAULT_SKEW)
+
+# Allowed slowdown against a --compare baseline before a stage counts as a regression
+DEFAULT_TOLERANCE = 0.1
+
+# Slowdowns shorter than this (seconds) are timer noise, never regressions
+MIN_REGRESSION_SECONDS = 0.01
+
+# Report stages: (name, method, args); the error_logs_by_date date is filled in
+# with the first day of the data
+REPORTS = [
+    ('top_n_ips', 'get_top_n_ips', (10,)),
+    ('top_n_urls', 'get_top_n_requested_urls', (10,)),
+    ('os_distribution', 'get_os_distribution', ()),
+    ('method_distribution', 'get_method_distribution', ()),
+    ('hourly_traffic', 'get_hourly_traffic', ()),
+    ('status_code_distribution', 'get_status_code_distribution', ()),
+    ('table_sizes', 'get_table_sizes', ()),
+    ('error_logs', 'get_error_logs', (404,)),
+    ('error_logs_by_date', 'get_error_logs_by_date', None),
+]
+
+
+def _stage(seconds, items, size_bytes=None):
+    """One stage's result: seconds, items handled and their rates."""
+    result = {'seconds': round(seconds, 6), 'items': items,
+              'items_per_sec': round(items / seconds, 1) if seconds else None}
+    if size_bytes is not None:
+        result['mb_per_sec'] = round(size_bytes / 1048576 / seconds, 2) if seconds else None
+    return result
+
+
+def _timed(run, repeat=1):
+    """Calls run() repeat times; returns (best seconds, last result)."""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _open_handler(args, config, data_dir):
+    """A handler on an empty store: a temporary Parquet directory, or a dedicated MySQL database."""
+    ua_classifier = UserAgentClassifier()
+    if args.backend == 'columnar':
+        # pyarrow is only needed for this backend
+        from columnar_handler import ColumnarHandler
+        return ColumnarHandler(data_dir, ua_classifier=ua_classifier)
+
+    import mysql.connector
+    import migrations
+    from mysql_handler import MySQLHandler
+
+    db_cfg = dict(config['mysql'])
+    database = args.database or f"{db_cfg.get('database', 'project1')}_bench"
+    if database == db_cfg.get('database'):
+        raise SystemExit(f"Refusing to benchmark in {database}: it is dropped and recreated; pick another --database")
+
+    # The benchmark database is recreated so every run inserts into empty tables
+    conn = mysql.connector.connect(host=db_cfg['host'], user=db_cfg['user'], password=db_cfg['password'],
+                                   port=db_cfg['port'])
+    cursor = conn.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    cursor.execute(f"CREATE DATABASE `{database}`")
+    conn.close()
+
+    db_cfg['database'] = database
+    handler = MySQLHandler(**db_cfg, ua_classifier=ua_classifier)
+    handler.create_tables()
+    migrations.migrate(handler)
+    return handler
+
+
+def run_suite(args, config):
+    """Runs every stage once against file_path and returns {stage: result}."""
+    stages = {}
+    file_path = args.file_path
+    size_bytes = os.path.getsize(file_path)
+    compressed = detect_compression(file_path) is not None
+
+    # read: decompress, decode and split the whole file
+    seconds, lines = _timed(lambda: sum(1 for _ in LogSource(file_path)))
+    stages['read'] = _stage(seconds, lines, None if compressed else size_bytes)
+
+    # The later stages run on the first stage_rows lines, held in memory
+    sample = list(itertools.islice(LogSource(file_path).lines_with_offsets(), args.stage_rows))
+    sample_lines = [line for _, line in sample]
+    sample_bytes = sum(len(line) for line in sample_lines)
+
+    log_parser = LogParser()
+    seconds, parsed = _timed(lambda: [log_parser.parse_line(line) for line in sample_lines])
+    stages['parse'] = _stage(seconds, len(parsed), sample_bytes)
+
+    records, offsets = [], []
+    for (offset, _), record in zip(sample, parsed):
+        if record:
+            records.append(record)
+            offsets.append(offset)
+    if not records:
+        raise SystemExit(f"No parseable lines in {file_path}")
+
+    data_dir = tempfile.mkdtemp(prefix='bench_columnar_')
+    handler = _open_handler(args, config, data_dir)
+    try:
+        # UA resolution: classification, plus the user_agents upsert on MySQL;
+        # cold on an empty cache, then warm on the same strings
+        resolve = getattr(handler, '_resolve_user_agents', handler.ua_classifier.classify_many)
+        user_agents = [record.user_agent for record in records if record.user_agent]
+        for stage in ('user_agents_cold', 'user_agents_warm'):
+            seconds, resolved = _timed(lambda: resolve(user_agents))
+            handler.commit()
+            stages[stage] = _stage(seconds, len(resolved))
+
+        source = SourceFile(file_path, file_fingerprint(file_path, detect_compression(file_path)))
+        batches = []
+        for start in range(0, len(records), args.batch_size):
+            batch = SourceBatch(records[start:start + args.batch_size], start=offsets[start], source=source)
+            batch.offsets = offsets[start:start + args.batch_size]
+            batch.end = offsets[start + args.batch_size] if start + args.batch_size < len(records) else size_bytes
+            batches.append(batch)
+
+        def insert():
+            for batch in batches:
+                handler.insert_batch_log_entries(batch, raise_errors=True)
+            # Columnar rows count once they are on disk
+            getattr(handler, '_flush', handler.commit)()
+        seconds, _ = _timed(insert)
+        stages['insert'] = _stage(seconds, len(records))
+
+        first_day = records[0].timestamp[:10]
+        for name, method, report_args in REPORTS:
+            report_args = (first_day,) if report_args is None else report_args
+            seconds, rows = _timed(lambda: list(getattr(handler, method)(*report_args)), repeat=args.repeat)
+            stages[f'report_{name}'] = _stage(seconds, len(rows))
+    finally:
+        handler.close()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return stages
+
+
+def compare(stages, baseline, tolerance):
+    """Returns [(stage, baseline seconds, seconds, change, regressed)] for the stages in both runs."""
+    rows = []
+    for name, result in stages.items():
+        before = baseline['stages'].get(name)
+        if not before or not before['seconds']:
+            continue
+        change = result['seconds'] / before['seconds'] - 1
+        regressed = change > tolerance and result['seconds'] - before['seconds'] > MIN_REGRESSION_SECONDS
+        rows.append((name, before['seconds'], result['seconds'], change, regressed))
+    return rows
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark each ingest and report stage on its own")
+    arg_parser.add_argument('--file', dest='file_path', help='Existing log file (default: generate one)')
+    arg_parser.add_argument('--lines', type=int, default=1000000, help='Lines to generate')
+    arg_parser.add_argument('--ips', type=int, default=DEFAULT_IPS, help='Distinct client IPs to generate')
+    arg_parser.add_argument('--paths', type=int, default=DEFAULT_PATHS, help='Distinct paths to generate')
+    arg_parser.add_argument('--user_agents', type=int, default=DEFAULT_USER_AGENTS,
+                            help='Distinct user agents to generate')
+    arg_parser.add_argument('--referrers', type=int, default=DEFAULT_REFERRERS, help='Distinct referrers to generate')
+    arg_parser.add_argument('--skew', type=float, default=DEFAULT_SKEW, help='Zipf exponent of value popularity')
+    arg_parser.add_argument('--seed', type=int, default=42, help='Generator seed')
+    arg_parser.add_argument('--gen_workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes generating the log file')
+    arg_parser.add_argument('--backend', choices=['columnar', 'mysql'], default='columnar',
+                            help='Store to insert into and report from')
+    arg_parser.add_argument('--config', default='config.ini', help='Config file with the [mysql] section')
+    arg_parser.add_argument('--database', help='MySQL database to recreate for the run (default: <database>_bench)')
+    arg_parser.add_argument('--batch_size', type=int, default=1000, help='Entries per insert batch')
+    arg_parser.add_argument('--stage_rows', type=int, default=1000000,
+                            help='Lines kept in memory for the parse, user agent and insert stages')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Runs per report; the best time is kept')
+    arg_parser.add_argument('--output', help='Write the results as JSON to this file')
+    arg_parser.add_argument('--compare', help='Baseline JSON from an earlier --output run')
+    arg_parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                            help='Slowdown per stage allowed against --compare (0.1 = 10%%)')
+    args = arg_parser.parse_args()
+
+    # Per-batch INFO logs would dominate the timings
+    logging.disable(logging.WARNING)
+    config = configparser.ConfigParser()
+    config.read(args.config)
+
+    stages = {}
+    generated = None
+    if not args.file_path:
+        generated = tempfile.NamedTemporaryFile(prefix='bench_', suffix='.log', delete=False).name
+        generator = SyntheticLogs(args.ips, args.paths, args.user_agents, args.referrers, args.skew, seed=args.seed)
+        seconds, written = _timed(lambda: generator.write(generated, args.lines, args.gen_workers))
+        stages['generate'] = _stage(seconds, args.lines, written)
+        args.file_path = generated
+
+    try:
+        stages.update(run_suite(args, config))
+    finally:
+        if generated:
+            os.remove(generated)
+
+    results = {
+        'meta': {
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'parameters': {key: value for key, value in vars(args).items()
+                           if key not in ('output', 'compare', 'config')},
+        },
+        'stages': stages,
+    }
+    if generated:
+        results['meta']['parameters']['file_path'] = None
+
+    print(tabulate(
+        [(name, f"{r['seconds']:.3f}", r['items'], f"{r['items_per_sec'] or 0:.0f}", r.get('mb_per_sec', ''))
+         for name, r in stages.items()],
+        headers=['Stage', 'Seconds', 'Items', 'Items/sec', 'MB/s'], tablefmt='grid'
+    ))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(stages, baseline, args.tolerance)
+        print(tabulate(
+            [(name, f"{before:.3f}", f"{after:.3f}", f"{change:+.1%}", 'REGRESSION' if regressed else '')
+             for name, before, after, change, regressed in rows],
+            headers=['Stage', 'Baseline', 'Now', 'Change', ''], tablefmt='grid'
+        ))
+        if any(regressed for *_, regressed in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# columnar_handler.py
+
+import os
+import json
+import time
+import uuid
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from ua_classifier import UserAgentClassifier
+from log_parser import DB_TIMESTAMP_FORMAT
+from metrics import METRICS, timed_report
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Buffered rows written out as one Parquet file per day
+FLUSH_ROWS = 200000
+
+SCHEMA = pa.schema([
+    ('ip_address', pa.string()),
+    ('timestamp', pa.timestamp('s')),
+    ('method', pa.string()),
+    ('path', pa.string()),
+    ('status_code', pa.int32()),
+    ('bytes_sent', pa.int64()),
+    ('referrer', pa.string()),
+    ('user_agent', pa.string()),
+    ('os', pa.string()),
+    ('browser', pa.string()),
+    ('device_type', pa.string()),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([('day', pa.string())]), flavor='hive')
+
+# Columns of the dataset as read back, with the day partition key; given explicitly so an
+# empty data_dir reads as an empty table instead of failing to find the columns
+DATASET_SCHEMA = SCHEMA.append(pa.field('day', pa.string()))
+
+
+def _value_counts(array):
+    """Returns (values, counts) arrays for the non-null values of a column."""
+    counts = pc.value_counts(array.combine_chunks() if isinstance(array, pa.ChunkedArray) else array)
+    mask = pc.is_valid(counts.field('values'))
+    return counts.field('values').filter(mask), counts.field('counts').filter(mask)
+
+
+def _top_k(values, counts, k):
+    """Returns [(value, count)] for the k largest counts, largest first."""
+    table = pa.table({'value': values, 'count': counts})
+    top = table.take(pc.select_k_unstable(table, k, sort_keys=[('count', 'descending')]))
+    return list(zip(top.column('value').to_pylist(), top.column('count').to_pylist()))
+
+
+class ColumnarHandler:
+    """Stores parsed log entries as day-partitioned Parquet files and reports from them.
+
+    Offers the same ingestion and report methods as MySQLHandler, so main.py
+    can use it for ad-hoc analysis without a database server.
+    """
+
+    uses_migrations = False
+
+    # One in-memory buffer, so the ingest pipeline runs a single writer
+    parallel_writers = False
+
+    def __init__(self, data_dir, ua_classifier=None):
+        self.data_dir = data_dir
+        self.ua_classifier = ua_classifier or UserAgentClassifier()
+        self._buffer = {name: [] for name in SCHEMA.names}
+        self._buffered_rows = 0
+        self._checkpoint_path = os.path.join(data_dir, 'checkpoints.json')
+        os.makedirs(data_dir, exist_ok=True)
+        logging.info(f"Using columnar storage in {data_dir}")
+
+    def clone(self):
+        return self
+
+    def close_clone(self):
+        """Nothing to close; clone() returns this handler."""
+
+    def create_tables(self):
+        """Nothing to create; partitions appear as data is written."""
+
+    def load_user_agent_cache(self):
+        """User agents are stored inline, so there is no ID cache to preload."""
+
+    def rebuild_rollups(self):
+        logging.info("Columnar backend computes reports directly; no rollups to rebuild.")
+
+    def _flush(self):
+        """Writes buffered rows as one compressed Parquet file per day partition."""
+        if not self._buffered_rows:
+            return
+        flush_started = time.perf_counter()
+
+        # Timestamps are buffered as stored-format strings and parsed in one pass
+        columns = dict(self._buffer)
+        columns['timestamp'] = pc.strptime(pa.array(columns['timestamp'], pa.string()),
+                                           format=DB_TIMESTAMP_FORMAT, unit='s')
+        table = pa.table(columns, schema=SCHEMA)
+        days = pc.strftime(table.column('timestamp'), format='%Y-%m-%d')
+        for day in pc.unique(days).to_pylist():
+            part = table.filter(pc.equal(days, day))
+            day_dir = os.path.join(self.data_dir, f'day={day}')
+            os.makedirs(day_dir, exist_ok=True)
+            pq.write_table(part, os.path.join(day_dir, f'part-{uuid.uuid4().hex}.parquet'), compression='zstd')
+
+        self._buffer = {name: [] for name in SCHEMA.names}
+        self._buffered_rows = 0
+        METRICS.observe('columnar_flush_seconds', time.perf_counter() - flush_started)
+
+    def insert_batch_log_entries(self, log_data_list, checkpoint=None, raise_errors=False, commit=True):
+        """Buffers a batch of LogRecords; returns True once accepted.
+
+        With a checkpoint the buffer is written out first, so the saved
+        offset never covers rows that only exist in memory. There are no
+        transactions, so commit is ignored.
+        """
+        with METRICS.timer('columnar_insert_step_seconds', step='user_agents'):
+            classified = self.ua_classifier.classify_many(
+                record.user_agent for record in log_data_list if record.user_agent
+            )
+        buffer = self._buffer
+
+        for ip_address, timestamp, method, path, status_code, bytes_sent, referrer, user_agent in log_data_list:
+            os_name, browser, device_type = classified.get(user_agent, (None, None, None))
+            buffer['ip_address'].append(ip_address)
+            # Wall-clock time without the offset, as MySQLHandler stores it
+            buffer['timestamp'].append(timestamp)
+            buffer['method'].append(method)
+            buffer['path'].append(path)
+            buffer['status_code'].append(status_code)
+            buffer['bytes_sent'].append(bytes_sent)
+            buffer['referrer'].append(referrer)
+            buffer['user_agent'].append(user_agent)
+            buffer['os'].append(os_name)
+            buffer['browser'].append(browser)
+            buffer['device_type'].append(device_type)
+        self._buffered_rows += len(log_data_list)
+        METRICS.inc('columnar_rows_buffered_total', len(log_data_list))
+
+        if checkpoint or self._buffered_rows >= FLUSH_ROWS:
+            self._flush()
+        if checkpoint:
+            self._save_checkpoint(*checkpoint)
+        logging.info(f"Inserted {len(log_data_list)} log entries.")
+        return True
+
+    def start_ingest_run(self):
+        """There is no ingest manifest for Parquet; returns None."""
+        return None
+
+    def committed_ranges(self, fingerprint):
+        return []
+
+    def commit(self):
+        """Nothing to do; buffered rows are written by _flush."""
+
+    def max_insert_rows(self):
+        """No statement size limit applies to Parquet."""
+        return None
+
+    def bulk_load_log_entries(self, batches, defer_checks=False):
+        """Writes all batches; there is no separate bulk path for Parquet."""
+        total = 0
+        for batch in batches:
+            self.insert_batch_log_entries(batch)
+            total += len(batch)
+        self._flush()
+        return total
+
+    def _save_checkpoint(self, file_path, inode, byte_offset):
+        checkpoints = {}
+        if os.path.exists(self._checkpoint_path):
+            with open(self._checkpoint_path) as f:
+                checkpoints = json.load(f)
+        checkpoints[file_path] = [inode, byte_offset]
+
+        tmp_path = self._checkpoint_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(checkpoints, f)
+        os.replace(tmp_path, self._checkpoint_path)
+
+    def get_checkpoint(self, file_path):
+        if not os.path.exists(self._checkpoint_path):
+            return None
+        with open(self._checkpoint_path) as f:
+            checkpoint = json.load(f).get(file_path)
+        return tuple(checkpoint) if checkpoint else None
+
+    def _dataset(self):
+        self._flush()
+        return ds.dataset(self.data_dir, format='parquet', schema=DATASET_SCHEMA, partitioning=PARTITIONING,
+                          exclude_invalid_files=True, ignore_prefixes=['.', '_', 'checkpoints'])
+
+    def _column(self, name, filter=None):
+        return self._dataset().to_table(columns=[name], filter=filter).column(name)
+
+    @timed_report
+    def get_top_n_ips(self, n):
+        values, counts = _value_counts(self._column('ip_address'))
+        return _top_k(values, counts, n)
+
+    @timed_report
+    def get_top_n_requested_urls(self, n):
+        values, counts = _value_counts(self._column('path'))
+        return [{'path': path, 'request_count': count} for path, count in _top_k(values, counts, n)]
+
+    @timed_report
+    def get_os_distribution(self):
+        values, counts = _value_counts(self._column('os'))
+        return [{'os': os_name, 'requests': count} for os_name, count in _top_k(values, counts, len(values))]
+
+    @timed_report
+    def get_method_distribution(self):
+        values, counts = _value_counts(self._column('method'))
+        return [{'method': method, 'request_count': count} for method, count in _top_k(values, counts, len(values))]
+
+    def _error_rows(self, filter, limit=None):
+        table = self._dataset().to_table(columns=['ip_address', 'path', 'status_code', 'timestamp'], filter=filter)
+        table = table.sort_by([('timestamp', 'descending')])
+        if limit is not None:
+            table = table.slice(0, limit)
+        for batch in table.to_batches():
+            yield from batch.to_pylist()
+
+    @timed_report
+    def get_error_logs(self, status_code):
+        return list(self._error_rows(ds.field('status_code') == status_code, limit=100))
+
+    @timed_report
+    def get_error_logs_by_date(self, date_str):
+        """Yields error rows for a date, newest first; only that day's partition is read."""
+        try:
+            datetime.strptime(date_str, '%Y-%m-%d')
+        except ValueError:
+            logging.error(f"Invalid date (expected YYYY-MM-DD): {date_str}")
+            return
+        yield from self._error_rows((ds.field('day') == date_str) & (ds.field('status_code') >= 400))
+
+    @timed_report
+    def get_hourly_traffic(self):
+        values, counts = _value_counts(pc.hour(self._column('timestamp')))
+        rows = sorted(zip(values.to_pylist(), counts.to_pylist()))
+        return [{'hour': hour, 'request_count': count} for hour, count in rows]
+
+    @timed_report
+    def get_status_code_distribution(self):
+        values, counts = _value_counts(self._column('status_code'))
+        total = pc.sum(counts).as_py() or 0
+        return [
+            (status_code, count, f"{(count / total * 100):.2f}%")
+            for status_code, count in _top_k(values, counts, len(values))
+        ]
+
+    @timed_report
+    def get_table_sizes(self):
+        """Rows and on-disk MB per day partition."""
+        dataset = self._dataset()
+        sizes = {}
+        for fragment in dataset.get_fragments():
+            day = os.path.basename(os.path.dirname(fragment.path)).split('=', 1)[1]
+            rows, size = sizes.get(day, (0, 0))
+            sizes[day] = (rows + fragment.metadata.num_rows, size + os.path.getsize(fragment.path))
+        return [
+            {'table_name': day, 'approx_rows': rows, 'data_mb': round(size / 1048576, 2)}
+            for day, (rows, size) in sorted(sizes.items())
+        ]
+
+    def pooled_report(self, name, args=()):
+        """Runs one report method and returns its rows; there are no connections to pool."""
+        return list(getattr(self, name)(*args))
+
+    def run_reports(self, reports, concurrent=True):
+        """Runs several report methods and returns {label: rows}; see MySQLHandler.run_reports.
+
+        Arrow compute releases the GIL, so threads give real overlap here.
+        """
+        started = time.perf_counter()
+        self._flush()
+        run = lambda name, args: list(getattr(self, name)(*args))
+        if concurrent:
+            with ThreadPoolExecutor(max_workers=min(len(reports), os.cpu_count() or 1) or 1) as executor:
+                futures = {label: executor.submit(run, name, args) for label, (name, args) in reports.items()}
+                results = {label: future.result() for label, future in futures.items()}
+        else:
+            results = {label: run(name, args) for label, (name, args) in reports.items()}
+
+        logging.info(f"Ran {len(reports)} reports {'concurrently' if concurrent else 'serially'} "
+                     f"in {time.perf_counter() - started:.3f}s")
+        return results
+
+    def close(self):
+        self._flush()
+        self.ua_classifier.close()
+        logging.info("Columnar storage flushed.")
@@ -21,38 +21,38 @@ $data = [];
 
 switch ($report) {
     case 'top_ips':
-        $sql = "SELECT ip_address, COUNT(*) AS request_count
-                FROM log_entries
+        $sql = "SELECT ip_address, SUM(request_count) AS request_count
+                FROM rollup_ip
                 GROUP BY ip_address
                 ORDER BY request_count DESC
                 LIMIT 10";
         break;
 
     case 'status_codes':
-        $sql = "SELECT status_code, COUNT(*) AS count
-                FROM log_entries
+        $sql = "SELECT status_code, SUM(request_count) AS count
+                FROM rollup_status
                 GROUP BY status_code
                 ORDER BY count DESC";
         break;
 
     case 'os_distribution':
-        $sql = "SELECT ua.os, COUNT(*) AS count
-                FROM log_entries le
-                JOIN user_agents ua ON le.user_agent_id = ua.id
+        $sql = "SELECT ua.os, SUM(r.request_count) AS count
+                FROM rollup_user_agent r
+                JOIN user_agents ua ON r.user_agent_id = ua.id
                 GROUP BY ua.os";
         break;
 
     case 'hourly_traffic':
-        $sql = "SELECT HOUR(timestamp) AS hour, COUNT(*) AS count
-                FROM log_entries
+        $sql = "SELECT HOUR(hour_bucket) AS hour, SUM(request_count) AS count
+                FROM rollup_status
                 GROUP BY hour
                 ORDER BY hour";
         break;
 
     case 'top_urls':
-        $sql = "SELECT path, COUNT(*) AS count
-                FROM log_entries
-                GROUP BY path
+        $sql = "SELECT MIN(path) AS path, SUM(request_count) AS count
+                FROM rollup_path
+                GROUP BY path_hash
                 ORDER BY count DESC
                 LIMIT 10";
         break;
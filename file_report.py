@@ -0,0 +1,96 @@
+# file_report.py
+
+import logging
+from collections import Counter
+from log_parser import LogParser
+from log_sources import LogSource
+from sketches import SpaceSaving
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Default error bound for the IP and path heavy-hitter sketches, as a fraction of all requests
+DEFAULT_EPSILON = 0.0001
+
+
+class FileReport:
+    """Report counters built by streaming log files, without a database.
+
+    Status code, hour and method use exact counters. IPs and paths use
+    Space-Saving sketches whose counts may be overestimated by at most
+    epsilon * total requests (shown per row as max_overcount).
+    """
+
+    def __init__(self, epsilon=DEFAULT_EPSILON):
+        self.epsilon = epsilon
+        self.total = 0
+        self.status_codes = Counter()
+        self.hours = Counter()
+        self.methods = Counter()
+        self.ips = SpaceSaving.from_epsilon(epsilon)
+        self.paths = SpaceSaving.from_epsilon(epsilon)
+
+    @classmethod
+    def from_file(cls, file_path, epsilon=DEFAULT_EPSILON):
+        report = cls(epsilon)
+        log_parser = LogParser()
+
+        for line in LogSource(file_path):
+            parsed = log_parser.parse_line(line)
+            if parsed:
+                report.add(parsed)
+        log_parser.malformed_lines.summary()
+
+        logging.info(f"Summarised {report.total} entries from {file_path}")
+        return report
+
+    @classmethod
+    def from_files(cls, file_paths, epsilon=DEFAULT_EPSILON):
+        """Builds one report per file and merges them."""
+        report = cls(epsilon)
+        for file_path in file_paths:
+            report = report.merge(cls.from_file(file_path, epsilon))
+        return report
+
+    def add(self, record):
+        self.total += 1
+        self.status_codes[record.status_code] += 1
+        self.hours[record.timestamp[11:13]] += 1
+        self.methods[record.method] += 1
+        self.ips.add(record.ip_address)
+        self.paths.add(record.path)
+
+    def merge(self, other):
+        """Returns a report covering both inputs."""
+        merged = FileReport(max(self.epsilon, other.epsilon))
+        merged.total = self.total + other.total
+        merged.status_codes = self.status_codes + other.status_codes
+        merged.hours = self.hours + other.hours
+        merged.methods = self.methods + other.methods
+        merged.ips = self.ips.merge(other.ips)
+        merged.paths = self.paths.merge(other.paths)
+        return merged
+
+    def get_status_code_distribution(self):
+        return [
+            (status_code, count, f"{(count / self.total * 100):.2f}%")
+            for status_code, count in self.status_codes.most_common()
+        ]
+
+    def get_hourly_traffic(self):
+        return [{'hour': int(hour), 'request_count': count} for hour, count in sorted(self.hours.items())]
+
+    def get_method_distribution(self):
+        return [{'method': method, 'request_count': count} for method, count in self.methods.most_common()]
+
+    def get_top_n_ips(self, n):
+        return [
+            {'ip_address': ip, 'request_count': count, 'max_overcount': error}
+            for ip, count, error in self.ips.top(n)
+        ]
+
+    def get_top_n_requested_urls(self, n):
+        return [
+            {'path': path, 'request_count': count, 'max_overcount': error}
+            for path, count, error in self.paths.top(n)
+        ]
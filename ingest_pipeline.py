@@ -0,0 +1,404 @@
+# ingest_pipeline.py
+
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from mysql.connector import Error, errorcode
+from log_sources import SourceBatch
+from metrics import METRICS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Parsed batches allowed to wait for a writer before the parser blocks
+DEFAULT_QUEUE_BATCHES = 8
+
+# Retries of a batch that lost a deadlock or lock wait against another writer
+LOCK_RETRIES = 3
+
+# Server errors after which the same batch can simply be retried
+RETRYABLE_ERRORS = {errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT}
+
+# Seconds between checks for a failed pipeline while blocked on the queue
+POLL_INTERVAL = 0.2
+
+# Adaptive batching: bounds on the rows per insert batch and batches per commit
+MIN_BATCH_SIZE = 100
+MAX_BATCH_SIZE = 100000
+MAX_BATCHES_PER_COMMIT = 32
+
+# Adaptive batching: a batch slower than this is halved, whatever its throughput
+MAX_BATCH_LATENCY = 0.5
+
+# Adaptive batching: a new setting is kept only if it is at least this much faster
+MIN_GAIN = 0.05
+
+# Adaptive batching: commits are grouped only while they take this share of write time
+MIN_COMMIT_SHARE = 0.1
+
+# Adaptive batching: transactions measured before each decision
+ADAPT_WINDOW = 4
+
+
+class IngestError(Exception):
+    """A pipeline stage failed; the load was stopped."""
+
+
+class StageTimer:
+    """Busy and waiting time of one pipeline stage, summed over its threads."""
+
+    def __init__(self, name):
+        self.name = name
+        self.busy = 0.0
+        self.waiting = 0.0
+        self.batches = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def add(self, busy, waiting, rows=0):
+        with self._lock:
+            self.busy += busy
+            self.waiting += waiting
+            self.batches += 1
+            self.rows += rows
+        METRICS.observe('ingest_stage_seconds', busy, stage=self.name)
+        METRICS.inc('ingest_stage_wait_seconds_total', waiting, stage=self.name)
+        METRICS.inc('ingest_stage_rows_total', rows, stage=self.name)
+
+    def log(self):
+        logging.info(f"Stage {self.name}: {self.batches} batches, {self.rows} rows, "
+                     f"busy {self.busy:.2f}s, waiting {self.waiting:.2f}s")
+
+
+class BatchSettings:
+    """Fixed rows per insert batch and batches committed per transaction."""
+
+    adaptive = False
+
+    def __init__(self, batch_size=1000, batches_per_commit=1):
+        self.batch_size = batch_size
+        self.batches_per_commit = batches_per_commit
+
+    def observe(self, rows, batches, insert_seconds, commit_seconds):
+        """Called by the writers after each committed transaction."""
+
+    def log(self):
+        logging.info(f"Insert settings: batch_size = {self.batch_size}, "
+                     f"batches_per_commit = {self.batches_per_commit}")
+
+
+class AdaptiveBatchSettings(BatchSettings):
+    """Tunes batch_size, then batches_per_commit, from the measured insert and commit times.
+
+    Every ADAPT_WINDOW transactions the write rate (rows per second of writer
+    time, times the number of writers) is compared with the best setting so
+    far. batch_size doubles while that gains MIN_GAIN, a batch stays under
+    MAX_BATCH_LATENCY and it fits in one INSERT under max_allowed_packet; then
+    batches_per_commit doubles while commits take MIN_COMMIT_SHARE of the time.
+    A step that does not pay is undone and tuning settles, as it does once
+    target_rate is reached.
+    """
+
+    adaptive = True
+
+    def __init__(self, batch_size=1000, batches_per_commit=1, target_rate=None,
+                 max_batch_size=MAX_BATCH_SIZE, writers=1):
+        super().__init__(batch_size, batches_per_commit)
+        self.target_rate = target_rate
+        self.max_batch_size = max(MIN_BATCH_SIZE, min(max_batch_size or MAX_BATCH_SIZE, MAX_BATCH_SIZE))
+        self.batch_size = max(MIN_BATCH_SIZE, min(batch_size, self.max_batch_size))
+        self.writers = writers
+        self.phase = 'batch_size'   # then 'batches_per_commit', then 'settled'
+        self._best = None           # (rate, batch_size, batches_per_commit)
+        self._window = [0, 0, 0, 0.0, 0.0]   # transactions, rows, batches, insert and commit seconds
+        self._lock = threading.Lock()
+
+    def observe(self, rows, batches, insert_seconds, commit_seconds):
+        with self._lock:
+            window = self._window
+            window[0] += 1
+            window[1] += rows
+            window[2] += batches
+            window[3] += insert_seconds
+            window[4] += commit_seconds
+            if window[0] < ADAPT_WINDOW * self.writers:
+                return
+            self._window = [0, 0, 0, 0.0, 0.0]
+            transactions, rows, batches, insert_seconds, commit_seconds = window
+            seconds = insert_seconds + commit_seconds
+            if seconds > 0:
+                self._adapt(rows / seconds * self.writers, insert_seconds / batches, commit_seconds / seconds)
+
+    def _set(self, batch_size, batches_per_commit, reason):
+        changes = [f"{name} {old} -> {new}" for name, old, new in (
+            ('batch_size', self.batch_size, batch_size),
+            ('batches_per_commit', self.batches_per_commit, batches_per_commit)) if old != new]
+        logging.info(f"Adaptive batching: {', '.join(changes)} ({reason})")
+        self.batch_size = batch_size
+        self.batches_per_commit = batches_per_commit
+
+    def _adapt(self, rate, latency, commit_share):
+        if latency > MAX_BATCH_LATENCY and self.batch_size > MIN_BATCH_SIZE:
+            self._best = None
+            self._set(max(MIN_BATCH_SIZE, self.batch_size // 2), self.batches_per_commit,
+                      f"{latency:.2f}s per batch")
+            return
+        if self.phase == 'settled':
+            return
+
+        if self._best is not None and rate < self._best[0] * (1 + MIN_GAIN):
+            # The last step did not pay: go back and move on to the next setting
+            best_rate, batch_size, batches_per_commit = self._best
+            self._set(batch_size, batches_per_commit, f"{rate:.0f} rows/sec vs {best_rate:.0f}")
+            self._next_phase()
+            return
+        self._best = (rate, self.batch_size, self.batches_per_commit)
+
+        if self.target_rate and rate >= self.target_rate:
+            logging.info(f"Adaptive batching: {rate:.0f} rows/sec reaches the target of {self.target_rate}")
+            self.phase = 'settled'
+            return
+
+        while self.phase != 'settled':
+            if self.phase == 'batch_size':
+                batch_size = min(self.batch_size * 2, self.max_batch_size)
+                if batch_size > self.batch_size and latency * 2 <= MAX_BATCH_LATENCY:
+                    self._set(batch_size, self.batches_per_commit, f"{rate:.0f} rows/sec")
+                    return
+            elif commit_share >= MIN_COMMIT_SHARE and self.batches_per_commit < MAX_BATCHES_PER_COMMIT:
+                self._set(self.batch_size, self.batches_per_commit * 2,
+                          f"{rate:.0f} rows/sec, commits {commit_share:.0%} of write time")
+                return
+            self._next_phase()
+
+    def _next_phase(self):
+        self.phase = 'batches_per_commit' if self.phase == 'batch_size' else 'settled'
+
+    def log(self):
+        super().log()
+        logging.info(f"To keep these, set batch_size = {self.batch_size} and "
+                     f"batches_per_commit = {self.batches_per_commit} under [ingest] in config.ini")
+
+
+class IngestPipeline:
+    """Parses and inserts at the same time: a bounded queue between the parser and writer threads.
+
+    The calling thread pulls batches from the parser and puts them on the
+    queue; when the queue is full it blocks, so parsing never runs more than
+    queue_batches ahead of the database. Each writer thread has its own
+    connection (db_handler.clone()), regroups the parsed rows into batches of
+    settings.batch_size (never joining two byte ranges that are not adjacent)
+    and commits every settings.batches_per_commit batches. A transaction's
+    dimension values are upserted up front, sorted, so writers lock
+    dimension rows in the same order.
+    Writers overlap their dimension lookups, log_entries inserts and commit
+    waits, but all of them add to the same rollup rows for the current hour;
+    those rows are only locked while a writer commits, which is where extra
+    writers stop paying off.
+    The first fatal error in any stage stops the whole pipeline and is
+    re-raised from run() as IngestError.
+    """
+
+    def __init__(self, db_handler, writers=1, queue_batches=DEFAULT_QUEUE_BATCHES, settings=None):
+        if writers > 1 and not getattr(db_handler, 'parallel_writers', True):
+            logging.info(f"{type(db_handler).__name__} takes one writer; ignoring writers={writers}")
+            writers = 1
+        self.db_handler = db_handler
+        self.writers = writers
+        self.settings = settings or BatchSettings()
+        self.queue = queue.Queue(maxsize=queue_batches)
+        self.stop = threading.Event()
+        self.error = None
+        self.parse_timer = StageTimer('parse')
+        self.write_timer = StageTimer('write')
+
+    def _fail(self, error):
+        if self.error is None:
+            self.error = error
+        self.stop.set()
+
+    def _insert(self, handler, batches):
+        """Inserts the batches in one transaction; returns (insert_seconds, commit_seconds).
+
+        A lock conflict rolls back the whole transaction, so every batch in it is retried.
+        """
+        for attempt in range(LOCK_RETRIES + 1):
+            try:
+                started = time.perf_counter()
+                if hasattr(handler, 'resolve_dimensions'):
+                    handler.resolve_dimensions(batches)
+                for batch in batches:
+                    handler.insert_batch_log_entries(batch, raise_errors=True, commit=False)
+                committing = time.perf_counter()
+                handler.commit()
+                finished = time.perf_counter()
+                METRICS.observe('ingest_transaction_seconds', committing - started, step='insert')
+                METRICS.observe('ingest_transaction_seconds', finished - committing, step='commit')
+                return committing - started, finished - committing
+            except Error as e:
+                if e.errno not in RETRYABLE_ERRORS or attempt == LOCK_RETRIES:
+                    raise
+                METRICS.inc('ingest_lock_retries_total')
+                logging.warning(f"Retrying transaction after lock conflict ({e.errno}), attempt {attempt + 1}")
+
+    def _write(self, handler, batches, waiting):
+        insert_seconds, commit_seconds = self._insert(handler, batches)
+        rows = sum(len(batch) for batch in batches)
+        self.write_timer.add(insert_seconds + commit_seconds, waiting, rows)
+        self.settings.observe(rows, len(batches), insert_seconds, commit_seconds)
+
+    @staticmethod
+    def _take(pending, size):
+        """Removes up to size rows from the front of pending as one SourceBatch.
+
+        Only batches that continue the same file where the last one ended are
+        joined, so every inserted batch covers one contiguous byte range.
+        """
+        batch = pending.popleft()
+        if len(batch) > size:
+            pending.appendleft(batch)
+            return batch.take(size)
+        while pending and len(batch) < size:
+            following = pending[0]
+            if following.source != batch.source or following.start != batch.end:
+                break
+            if len(following) > size - len(batch):
+                batch.extend_batch(following.take(size - len(batch)))
+            else:
+                batch.extend_batch(pending.popleft())
+        return batch
+
+    def _writer(self, handler):
+        settings = self.settings
+        pending = deque()   # parsed batches not yet cut into insert batches
+        pending_rows = 0
+        batches = []        # batches of the next transaction
+        waiting = 0.0
+        finished = False
+        try:
+            while not self.stop.is_set():
+                if not finished and pending_rows < settings.batch_size:
+                    waited = time.perf_counter()
+                    try:
+                        parsed = self.queue.get(timeout=POLL_INTERVAL)
+                    except queue.Empty:
+                        continue
+                    finally:
+                        waiting += time.perf_counter() - waited
+                    if parsed is None:
+                        finished = True
+                    elif parsed:
+                        pending.append(parsed if isinstance(parsed, SourceBatch) else SourceBatch(parsed))
+                        pending_rows += len(parsed)
+                    continue
+
+                if pending:
+                    batch = self._take(pending, settings.batch_size)
+                    pending_rows -= len(batch)
+                    batches.append(batch)
+                if batches and (len(batches) >= settings.batches_per_commit or (finished and not pending)):
+                    self._write(handler, batches, waiting)
+                    batches, waiting = [], 0.0
+                if finished and not pending and not batches:
+                    break
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            if handler is not self.db_handler:
+                handler.close_clone()
+
+    def _put(self, item):
+        """Blocks until the item is queued; returns False if the pipeline was stopped meanwhile."""
+        while not self.stop.is_set():
+            try:
+                self.queue.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self, batches):
+        """Loads every batch; returns the number of rows committed."""
+        started = time.perf_counter()
+        handlers = [self.db_handler] + [self.db_handler.clone() for _ in range(self.writers - 1)]
+        threads = [threading.Thread(target=self._writer, args=(handler,), name=f'writer-{i}')
+                   for i, handler in enumerate(handlers)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            batches = iter(batches)
+            while not self.stop.is_set():
+                parse_started = time.perf_counter()
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                put_started = time.perf_counter()
+                if not self._put(batch):
+                    break
+                self.parse_timer.add(put_started - parse_started, time.perf_counter() - put_started, len(batch))
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            # One end marker per writer; skipped if they are already stopping
+            for _ in threads:
+                if not self._put(None):
+                    break
+            for thread in threads:
+                thread.join()
+
+        elapsed = time.perf_counter() - started
+        self.parse_timer.log()
+        self.write_timer.log()
+        self.settings.log()
+        logging.info(f"Pipeline: {self.write_timer.rows} rows committed by {self.writers} writer(s) "
+                     f"in {elapsed:.2f}s ({self.write_timer.rows / elapsed if elapsed else 0:.0f} rows/sec)")
+
+        if self.error is not None:
+            raise IngestError(f"Load stopped after {self.write_timer.rows} rows: {self.error}") from self.error
+        return self.write_timer.rows
+
+
+def prefetch(batches, queue_batches=DEFAULT_QUEUE_BATCHES):
+    """Yields batches that a background thread parses ahead, up to queue_batches at a time.
+
+    For consumers such as bulk_load_log_entries that take an iterable: parsing
+    overlaps with loading, and parse errors are re-raised in the consumer.
+    """
+    batch_queue = queue.Queue(maxsize=queue_batches)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for batch in batches:
+                while not stop.is_set():
+                    try:
+                        batch_queue.put(batch, timeout=POLL_INTERVAL)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except BaseException as e:
+            batch_queue.put(e)
+        batch_queue.put(None)
+
+    producer = threading.Thread(target=produce, name='parser', daemon=True)
+    producer.start()
+    try:
+        while True:
+            batch = batch_queue.get()
+            if batch is None:
+                break
+            if isinstance(batch, BaseException):
+                raise batch
+            yield batch
+    finally:
+        stop.set()
+        while producer.is_alive():
+            try:
+                batch_queue.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                pass
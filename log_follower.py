@@ -0,0 +1,191 @@
+# log_follower.py
+
+import os
+import time
+import logging
+from log_parser import LogParser
+from migrations import top_up_partitions
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Bytes read from a file per poll
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Stop reading a file while this many batches are waiting to be committed
+MAX_PENDING_BATCHES = 10
+
+# Seconds between checks that daily partitions still reach PARTITION_DAYS_AHEAD days ahead
+PARTITION_CHECK_INTERVAL = 3600
+
+
+class FollowedFile:
+    """Read position and uncommitted entries for one followed log file."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.file = None
+        self.inode = None
+        self.position = 0       # offset just past the last complete line read
+        self.buffer = b''       # trailing partial line
+        self.pending = []
+        self.pending_since = None
+
+    def open(self, offset):
+        self.close()
+        self.file = open(self.path, 'rb')
+        self.inode = os.fstat(self.file.fileno()).st_ino
+        self.seek(offset)
+
+    def seek(self, offset):
+        self.file.seek(offset)
+        self.position = offset
+        self.buffer = b''
+
+    def read_lines(self, max_bytes, final=False):
+        """Returns the complete lines available; with final, a trailing partial line too."""
+        data = self.file.read(max_bytes)
+        if not data and not (final and self.buffer):
+            return []
+
+        lines = (self.buffer + data).split(b'\n')
+        self.buffer = b'' if final else lines.pop()
+        self.position = self.file.tell() - len(self.buffer)
+        return lines
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class LogFollower:
+    """Tails access logs like `tail -F`, inserting new lines and checkpointing offsets.
+
+    Each batch is committed together with the (inode, byte offset) it reaches,
+    so a restart resumes exactly after the last committed line. Rotation
+    (inode change) and truncation are detected on every poll. On MySQL, daily
+    partitions are topped up every PARTITION_CHECK_INTERVAL seconds, so a
+    long-running follower never fills p_future.
+    """
+
+    def __init__(self, db_handler, file_paths, batch_size=1000, flush_interval=2.0,
+                 poll_interval=0.5, from_start=False, malformed_lines=None, anomaly_detector=None):
+        self.db_handler = db_handler
+        self.files = [FollowedFile(path) for path in file_paths]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.from_start = from_start
+        self.log_parser = LogParser(malformed_lines)
+        # Sees each batch once it is committed, so a retried insert is not counted twice
+        self.anomaly_detector = anomaly_detector
+
+    def _open(self, followed):
+        """Opens a followed file at its checkpoint; returns False if it does not exist yet."""
+        try:
+            st = os.stat(followed.path)
+        except FileNotFoundError:
+            return False
+
+        checkpoint = self.db_handler.get_checkpoint(followed.path)
+        if checkpoint and checkpoint[0] == st.st_ino and checkpoint[1] <= st.st_size:
+            offset = checkpoint[1]
+            logging.info(f"Resuming {followed.path} at byte {offset}")
+        elif checkpoint:
+            offset = 0
+            logging.warning(f"{followed.path} was rotated or truncated since the last run; reading from the start")
+        else:
+            offset = 0 if self.from_start else st.st_size
+            logging.info(f"Following {followed.path} from byte {offset}")
+
+        followed.open(offset)
+        return True
+
+    def _add_lines(self, followed, lines):
+        for line in lines:
+            if not line:
+                continue
+            parsed = self.log_parser.parse_line(line.decode('utf-8', errors='ignore'))
+            if parsed:
+                if not followed.pending:
+                    followed.pending_since = time.monotonic()
+                followed.pending.append(parsed)
+
+    def _flush(self, followed):
+        """Commits pending entries with their checkpoint; returns False if the insert failed."""
+        if not followed.pending:
+            return True
+
+        checkpoint = (followed.path, followed.inode, followed.position)
+        if not self.db_handler.insert_batch_log_entries(followed.pending, checkpoint=checkpoint):
+            return False
+        if self.anomaly_detector is not None:
+            self.anomaly_detector.observe(followed.pending)
+        followed.pending = []
+        followed.pending_since = None
+        self.log_parser.report_metrics()
+        self.log_parser.malformed_lines.flush_rejects()
+        return True
+
+    def _check_rotation(self, followed):
+        try:
+            st = os.stat(followed.path)
+        except FileNotFoundError:
+            # Rotated away and not recreated yet; keep reading the old handle
+            return
+
+        if st.st_ino != followed.inode:
+            # Finish the rotated file before switching to the new one
+            while True:
+                lines = followed.read_lines(READ_CHUNK_SIZE, final=True)
+                if not lines:
+                    break
+                self._add_lines(followed, lines)
+            if self._flush(followed):
+                logging.info(f"{followed.path} rotated; following the new file")
+                followed.open(0)
+        elif st.st_size < followed.position:
+            if self._flush(followed):
+                logging.info(f"{followed.path} truncated; reading from the start")
+                followed.seek(0)
+
+    def _poll(self, followed):
+        """Reads and queues new lines from one file; returns True if any were read."""
+        if followed.file is None and not self._open(followed):
+            return False
+
+        self._check_rotation(followed)
+
+        lines = []
+        if len(followed.pending) < self.batch_size * MAX_PENDING_BATCHES:
+            lines = followed.read_lines(READ_CHUNK_SIZE)
+            self._add_lines(followed, lines)
+
+        if followed.pending and (len(followed.pending) >= self.batch_size
+                                 or time.monotonic() - followed.pending_since >= self.flush_interval):
+            self._flush(followed)
+
+        return bool(lines)
+
+    def run(self):
+        next_partition_check = time.monotonic()
+        try:
+            while True:
+                if time.monotonic() >= next_partition_check:
+                    # Between flushes, so no transaction is open on the connection
+                    top_up_partitions(self.db_handler)
+                    next_partition_check = time.monotonic() + PARTITION_CHECK_INTERVAL
+                active = [self._poll(followed) for followed in self.files]
+                if not any(active):
+                    time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            logging.info("Stopping log follower.")
+        finally:
+            for followed in self.files:
+                if followed.file is not None:
+                    self._flush(followed)
+                followed.close()
+            self.log_parser.malformed_lines.summary()
+            if self.anomaly_detector is not None:
+                self.anomaly_detector.close()
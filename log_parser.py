@@ -1,28 +1,97 @@
 # log_parser.py
 
 import re
-from datetime import datetime
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple, Optional
 import logging
 import configparser
+from metrics import METRICS
+from malformed_lines import MalformedLines
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Month abbreviations as written by Apache ('%b' in the C locale)
+MONTHS = {
+    'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+    'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12,
+}
+
+# Decoded timestamps are cached per string; the cache is dropped when it gets this big
+TIMESTAMP_CACHE_SIZE = 10000
+
+# tzinfo objects keyed by the '+zzzz' offset string
+_TIMEZONES = {}
+
+# Format of the timestamp column as stored in log_entries
+DB_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class LogRecord(NamedTuple):
+    """One parsed log line.
+
+    A tuple subclass with no per-instance dict, so a batch costs a fraction
+    of the memory of per-line dicts, pickles compactly between processes and
+    unpacks straight into a row. The timestamp is the line's wall-clock time
+    already formatted as stored ('YYYY-MM-DD HH:MM:SS'), so writers and
+    reports never format it again.
+    """
+    ip_address: str
+    timestamp: str
+    method: str
+    path: str
+    status_code: int
+    bytes_sent: int
+    referrer: Optional[str]
+    user_agent: Optional[str]
+
+
+# Builds a LogRecord without the keyword handling of LogRecord(...)
+_new_record = tuple.__new__
+
+
+def record_parse_stats(stats):
+    """Adds a LogParser.take_stats() dict to METRICS."""
+    METRICS.inc('parse_lines_total', stats['fast_lines'], path='fast')
+    METRICS.inc('parse_lines_total', stats['regex_lines'], path='regex')
+    METRICS.inc('parse_regex_seconds_total', stats['regex_seconds'])
+    METRICS.inc('parse_strptime_seconds_total', stats['strptime_seconds'])
+    for reason, count in stats['malformed'].items():
+        METRICS.inc('parse_malformed_total', count, reason=reason)
+
 
 class LogParser:
-    """Parses individual log lines using regex."""
+    """Parses individual log lines using regex, with a fast path for the Combined Log Format."""
 
-    def __init__(self):
+    def __init__(self, malformed_lines=None):
         config = configparser.ConfigParser()
         config.read('config.ini')
+        self._timestamp_cache = {}
+
+        # Per-line counts in plain attributes, added to METRICS by report_metrics()
+        self.fast_lines = 0
+        self.regex_lines = 0
+        self.regex_seconds = 0.0
+        self.strptime_seconds = 0.0
+        self.malformed = Counter()
+        # Categorises, samples and rate-limits the logging of rejected lines; may be shared by several parsers
+        self.malformed_lines = malformed_lines if malformed_lines is not None else MalformedLines()
+        self.combined_format = False
 
         try:
             pattern = config['log']['regex']
             self.LOG_PATTERN = re.compile(pattern)
             logging.info("Loaded log pattern from config.ini")
+            # A custom regex may not describe the combined format, so the
+            # fast path is only used when explicitly enabled.
+            self.fast_path = config.getboolean('log', 'fast_path', fallback=False)
         except KeyError:
             # Use default Apache Combined Log Format if regex not found in config
             logging.info("Using default Apache regex pattern.")
+            self.combined_format = True
+            self.fast_path = config.getboolean('log', 'fast_path', fallback=True)
             self.LOG_PATTERN = re.compile(
                 r'(?P<ip_address>\d{1,3}(?:\.\d{1,3}){3}) - - '
                 r'\[(?P<timestamp>[^\]]+)\] '
@@ -33,35 +102,172 @@ class LogParser:
             )
 
     def parse_line(self, log_line):
-        """Parses a single log line into structured data."""
+        """Parses a single log line into a LogRecord; returns None if it is malformed."""
+        if self.fast_path:
+            parsed = self._parse_combined(log_line)
+            if parsed is not None:
+                self.fast_lines += 1
+                return parsed
+        # Lines off the fast path are rare and slow, so each is timed
+        started = time.perf_counter()
+        parsed = self._parse_regex(log_line)
+        self.regex_seconds += time.perf_counter() - started
+        self.regex_lines += 1
+        return parsed
+
+    def take_stats(self):
+        """Returns the line counts and timings since the last call as a dict, and resets them.
+
+        The dict is small and picklable, so parse workers can send theirs back
+        with their entries.
+        """
+        stats = {'fast_lines': self.fast_lines, 'regex_lines': self.regex_lines,
+                 'regex_seconds': self.regex_seconds, 'strptime_seconds': self.strptime_seconds,
+                 'malformed': dict(self.malformed)}
+        self.fast_lines = self.regex_lines = 0
+        self.regex_seconds = self.strptime_seconds = 0.0
+        self.malformed.clear()
+        return stats
+
+    def report_metrics(self):
+        """Adds the counts since the last call to METRICS."""
+        record_parse_stats(self.take_stats())
+
+    def _parse_timestamp(self, timestamp_str):
+        """Decodes 'dd/Mon/YYYY:HH:MM:SS +zzzz' to the stored format; returns None if the string is in any other shape."""
+        timestamp = self._timestamp_cache.get(timestamp_str)
+        if timestamp is not None:
+            return timestamp
+
+        s = timestamp_str
+        if (len(s) != 26 or s[2] != '/' or s[6] != '/' or s[11] != ':' or s[14] != ':'
+                or s[17] != ':' or s[20] != ' ' or s[21] not in '+-' or s[24] not in '012345'):
+            return None
+        month = MONTHS.get(s[3:6])
+        digits = s[0:2] + s[7:11] + s[12:14] + s[15:17] + s[18:20] + s[22:26]
+        if month is None or not (digits.isascii() and digits.isdigit()):
+            return None
+
+        try:
+            tz = _TIMEZONES.get(s[21:])
+            if tz is None:
+                offset = timedelta(hours=int(s[22:24]), minutes=int(s[24:26]))
+                tz = _TIMEZONES[s[21:]] = timezone(-offset if s[21] == '-' else offset)
+            timestamp = datetime(int(s[7:11]), month, int(s[0:2]), int(s[12:14]),
+                                 int(s[15:17]), int(s[18:20]), tzinfo=tz).strftime(DB_TIMESTAMP_FORMAT)
+        except ValueError:
+            return None
+
+        if len(self._timestamp_cache) >= TIMESTAMP_CACHE_SIZE:
+            self._timestamp_cache.clear()
+        self._timestamp_cache[timestamp_str] = timestamp
+        return timestamp
+
+    def _parse_combined(self, log_line):
+        """Parses a Combined Log Format line by splitting on its fixed delimiters.
+
+        Only lines the default regex would parse identically are accepted;
+        anything else returns None so the caller falls back to the regex.
+        """
+        # 'IP - - [TS] ', request, ' STATUS BYTES ', referrer, ' ', user agent, trailer
+        parts = log_line.split('"')
+        if len(parts) != 7 or parts[4] != ' ' or '\n' in parts[5]:
+            return None
+
+        ip_address, sep, timestamp_str = parts[0].partition(' - - [')
+        octets = ip_address.split('.')
+        if (not sep or len(octets) != 4 or '' in octets or max(map(len, octets)) > 3
+                or not ip_address.isascii() or not ip_address.replace('.', '').isdigit()
+                or timestamp_str[-2:] != '] '):
+            return None
+        timestamp = self._parse_timestamp(timestamp_str[:-2])
+        if timestamp is None:
+            return None
+
+        request = parts[1].split(' ')
+        if len(request) != 3:
+            return None
+        method, path, protocol = request
+        major, dot, minor = protocol[5:].partition('.')
+        if (not (method.isascii() and method.isalpha() and method.isupper())
+                or path.split() != [path]
+                or not protocol.startswith('HTTP/') or not protocol.isascii()
+                or len(major) != 1 or not major.isdigit() or (dot and not minor.isdigit())):
+            return None
+
+        response = parts[2].split(' ')
+        if len(response) != 4 or response[0] or response[3]:
+            return None
+        status_code, bytes_sent = response[1], response[2]
+        if (len(status_code) != 3 or not status_code.isascii() or not status_code.isdigit()
+                or not (bytes_sent == '-' or (bytes_sent.isascii() and bytes_sent.isdigit()))):
+            return None
+
+        return _new_record(LogRecord, (
+            ip_address,
+            timestamp,
+            method,
+            path,
+            int(status_code),
+            int(bytes_sent) if bytes_sent != '-' else 0,
+            parts[3] or None,
+            parts[5] or None,
+        ))
+
+    @staticmethod
+    def _strptime_timestamp(timestamp_str):
+        """Parses a timestamp with strptime, with or without an offset, to the stored format."""
+        try:
+            timestamp = datetime.strptime(timestamp_str, '%d/%b/%Y:%H:%M:%S %z')
+        except ValueError:
+            timestamp = datetime.strptime(timestamp_str, '%d/%b/%Y:%H:%M:%S')
+        return timestamp.strftime(DB_TIMESTAMP_FORMAT)
+
+    def _parse_regex(self, log_line):
+        """Parses a single log line with the configured regex."""
         match = self.LOG_PATTERN.match(log_line)
         if match:
             try:
-                timestamp_str = match.group("timestamp")
-
                 # Try parsing with timezone first, fallback without
+                started = time.perf_counter()
                 try:
-                    timestamp = datetime.strptime(timestamp_str, '%d/%b/%Y:%H:%M:%S %z')
+                    timestamp = self._strptime_timestamp(match.group("timestamp"))
                 except ValueError:
-                    timestamp = datetime.strptime(timestamp_str, '%d/%b/%Y:%H:%M:%S')
+                    self._reject('bad_timestamp', log_line)
+                    return None
+                finally:
+                    self.strptime_seconds += time.perf_counter() - started
 
                 bytes_sent_str = match.group("bytes_sent")
                 bytes_sent = int(bytes_sent_str) if bytes_sent_str != '-' else 0
 
-                return {
-                    "ip_address": match.group("ip_address"),
-                    "timestamp": timestamp,
-                    "method": match.group("method"),
-                    "path": match.group("path"),
-                    "status_code": int(match.group("status_code")),
-                    "bytes_sent": bytes_sent,
-                    "referrer": match.group("referrer") or None,
-                    "user_agent": match.group("user_agent") or None,
-                }
-
-            except Exception as e:
-                logging.warning(f"Failed to parse line due to error: {e}")
+                return LogRecord(
+                    match.group("ip_address"),
+                    timestamp,
+                    match.group("method"),
+                    match.group("path"),
+                    int(match.group("status_code")),
+                    bytes_sent,
+                    match.group("referrer") or None,
+                    match.group("user_agent") or None,
+                )
+
+            except Exception:
+                self._reject('bad_field', log_line)
                 return None
         else:
-            logging.warning(f"Malformed log line skipped: {log_line.strip()}")
-            return None
\ No newline at end of file
+            self._reject(self._no_match_category(log_line), log_line)
+            return None
+
+    def _no_match_category(self, log_line):
+        """Why a line did not match: empty, truncated (a Combined Log Format line cut off after its request) or no_match."""
+        stripped = log_line.rstrip()
+        if not stripped:
+            return 'empty'
+        if self.combined_format and '"' in stripped and not stripped.endswith('"'):
+            return 'truncated'
+        return 'no_match'
+
+    def _reject(self, category, log_line):
+        self.malformed[category] += 1
+        self.malformed_lines.add(category, log_line)
\ No newline at end of file
@@ -0,0 +1,241 @@
+# log_sources.py
+
+import io
+import os
+import bz2
+import glob
+import gzip
+import lzma
+import queue
+import hashlib
+import logging
+import threading
+from typing import NamedTuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Decompressed bytes handed from the reader thread to the parser at a time
+READ_SIZE = 4 * 1024 * 1024
+
+# Chunks the reader thread may get ahead of the parser
+READ_AHEAD_CHUNKS = 4
+
+# Most bytes of a file's first line hashed into its fingerprint
+FINGERPRINT_BYTES = 4096
+
+# Leading bytes of each supported compressed format
+MAGIC_BYTES = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+    (b'\xfd7zXZ\x00', 'xz'),
+]
+
+
+def expand_paths(patterns):
+    """Expands files, directories and glob patterns into a list of log file paths.
+
+    Directory contents and glob matches are ordered oldest first by
+    modification time, so rotated logs (access.log.2.gz, access.log.1,
+    access.log) load in the order they were written. Patterns that match
+    nothing are kept so the caller reports them as missing.
+    """
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        else:
+            matches = glob.glob(pattern) or [pattern]
+        files = [path for path in matches if not os.path.isdir(path)]
+        paths.extend(sorted(files, key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0))
+    return paths
+
+
+def detect_compression(file_path):
+    """Returns 'gzip', 'bz2', 'zstd', 'xz' or None, from the file's leading bytes."""
+    with open(file_path, 'rb') as f:
+        head = f.read(6)
+    for magic, name in MAGIC_BYTES:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def open_log(file_path, compression=None):
+    """Opens a log file for binary reading, decompressing it on the fly."""
+    if compression == 'gzip':
+        return gzip.open(file_path, 'rb')
+    if compression == 'bz2':
+        return bz2.open(file_path, 'rb')
+    if compression == 'xz':
+        return lzma.open(file_path, 'rb')
+    if compression == 'zstd':
+        # zstandard is only needed for .zst logs
+        import zstandard
+        return zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+    return open(file_path, 'rb', buffering=0)
+
+
+def file_fingerprint(file_path, compression=None):
+    """SHA-1 of the file's first decompressed line.
+
+    It stays the same while the log grows and after it is rotated or
+    compressed, so the ingest manifest recognises the same file under any name.
+    """
+    head = b''
+    with open_log(file_path, compression) as f:
+        while len(head) < FINGERPRINT_BYTES:
+            data = f.read(FINGERPRINT_BYTES - len(head))
+            if not data:
+                break
+            head += data
+    newline = head.find(b'\n')
+    return hashlib.sha1(head[:newline + 1] if newline >= 0 else head).digest()
+
+
+class SourceFile(NamedTuple):
+    """A log file as the ingest manifest identifies it."""
+    path: str
+    fingerprint: bytes
+
+
+class SourceBatch(list):
+    """LogRecords parsed from bytes [start, end) of one log file, with the byte offset of each record's line.
+
+    Offsets are in decompressed bytes, and empty if the positions are not
+    known. source is the SourceFile, set by the caller that knows it; the
+    readers only track positions.
+    """
+
+    __slots__ = ('start', 'end', 'offsets', 'source')
+
+    def __init__(self, records=(), start=0, end=0, offsets=None, source=None):
+        super().__init__(records)
+        self.start = start
+        self.end = end
+        self.offsets = offsets if offsets is not None else []
+        self.source = source
+
+    def take(self, n):
+        """Removes the first n records, returning them as a batch that ends where the rest begins."""
+        end = self.offsets[n] if self.offsets else self.end
+        head = SourceBatch(self[:n], self.start, end, self.offsets[:n], self.source)
+        del self[:n]
+        del self.offsets[:n]
+        self.start = head.end
+        return head
+
+    def extend_batch(self, other):
+        """Appends the batch that starts where this one ends."""
+        self.extend(other)
+        self.offsets.extend(other.offsets)
+        self.end = other.end
+
+
+def split_lines(data, offset=0):
+    """Yields (byte offset, line) for the lines of a chunk, split and decoded as text-mode reading would."""
+    if data.isascii() and b'\r' not in data:
+        # Characters are bytes and no newline is translated
+        for line in io.StringIO(data.decode('ascii'), newline=None):
+            yield offset, line
+            offset += len(line)
+        return
+    for raw in data.splitlines(keepends=True):
+        line = raw.decode('utf-8', errors='ignore')
+        if line.endswith('\r\n'):
+            line = line[:-2] + '\n'
+        elif line.endswith('\r'):
+            line = line[:-1] + '\n'
+        yield offset, line
+        offset += len(raw)
+
+
+def _skip(f, compression, start):
+    """Positions a just opened log at decompressed byte offset start."""
+    if compression is None:
+        f.seek(start)
+        return
+    while start > 0:
+        data = f.read(min(READ_SIZE, start))
+        if not data:
+            break
+        start -= len(data)
+
+
+def _read_chunks(file_path, compression, chunks, stats, stop, start=0):
+    """Reader thread: puts newline-terminated chunks of decompressed bytes on the queue, then None."""
+    try:
+        with open_log(file_path, compression) as f:
+            if start:
+                _skip(f, compression, start)
+            tail = b''
+            while not stop.is_set():
+                data = f.read(READ_SIZE)
+                if not data:
+                    break
+                stats['bytes'] += len(data)
+                data = tail + data
+                cut = data.rfind(b'\n') + 1
+                tail = data[cut:]
+                if cut:
+                    chunks.put(data[:cut])
+            if tail:
+                chunks.put(tail)
+    except BaseException as e:
+        chunks.put(e)
+    finally:
+        chunks.put(None)
+
+
+class LogSource:
+    """Lines of one plain or compressed log file, read and inflated in a background thread.
+
+    Decompression (zlib, bz2, lzma and zstd all release the GIL) overlaps with
+    parsing and inserting in the caller. Each chunk is decoded to text once
+    rather than line by line. bytes counts the decompressed bytes read.
+    Reading starts at decompressed byte offset start, which must begin a line.
+    """
+
+    def __init__(self, file_path, start=0):
+        self.path = file_path
+        self.start = start
+        self.compression = detect_compression(file_path)
+        self.stats = {'bytes': 0}
+        self.position = start   # decompressed offset just past the last chunk handed out
+
+    def __iter__(self):
+        for chunk in self._chunks():
+            # Same universal-newline split as reading the file in text mode
+            yield from io.StringIO(chunk.decode('utf-8', errors='ignore'), newline=None)
+
+    def lines_with_offsets(self):
+        """Yields (byte offset, line) for every line, the offset counted in decompressed bytes."""
+        for chunk in self._chunks():
+            yield from split_lines(chunk, self.position - len(chunk))
+
+    def _chunks(self):
+        chunks = queue.Queue(maxsize=READ_AHEAD_CHUNKS)
+        stop = threading.Event()
+        reader = threading.Thread(target=_read_chunks, daemon=True,
+                                  args=(self.path, self.compression, chunks, self.stats, stop, self.start))
+        reader.start()
+        self.position = self.start
+
+        try:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                self.position += len(chunk)
+                yield chunk
+        finally:
+            # Unblock the reader if the caller stopped early
+            stop.set()
+            while reader.is_alive():
+                try:
+                    chunks.get(timeout=0.1)
+                except queue.Empty:
+                    pass
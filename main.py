@@ -1,15 +1,39 @@
 import argparse
+import csv
+import json
 import logging
 import configparser
+import os
+import sys
+import time
+from contextlib import nullcontext
 from tabulate import tabulate
 from log_parser import LogParser
+from malformed_lines import MalformedLines
 from mysql_handler import MySQLHandler
+from parallel_ingest import iter_parsed_batches
+from log_sources import LogSource, SourceBatch, SourceFile, expand_paths, detect_compression, file_fingerprint
+from ingest_manifest import CommittedRanges
+from mmap_parser import MmapLogReader
+from ingest_pipeline import (IngestPipeline, BatchSettings, AdaptiveBatchSettings, prefetch,
+                             DEFAULT_QUEUE_BATCHES)
+from ua_classifier import UserAgentClassifier
+from log_follower import LogFollower
+from migrations import migrate, pending_migrations, top_up_partitions
+from file_report import FileReport, DEFAULT_EPSILON
+from report_cache import ReportCache, DEFAULT_TTL, DEFAULT_MAX_ENTRIES
+from report_server import ReportServer
+from metrics import MetricsReporter, profiled, DEFAULT_INTERVAL
+from anomaly_detector import AnomalyDetector, JsonlAnomalySink, TableAnomalySink
 from datetime import datetime
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Reports that generate_report --from-file can build without a database
+FILE_REPORT_TYPES = {'status_code_distribution', 'hourly_traffic', 'method_distribution', 'top_n_ips', 'top_n_urls'}
+
 
 class CLIManager:
     def __init__(self, db_handler):
@@ -20,101 +44,529 @@ class CLIManager:
     def _add_subcommands(self):
         subparsers = self.parser.add_subparsers(dest='command', help='Main commands')
 
+        # Metrics and profiling options shared by the ingest commands
+        observability = argparse.ArgumentParser(add_help=False)
+        observability.add_argument('--metrics_interval', type=float,
+                                   help=f'Print per-stage counters and latency histograms every N seconds '
+                                        f'(default with --metrics_file: {DEFAULT_INTERVAL:g})')
+        observability.add_argument('--metrics_file', type=str,
+                                   help='Write metrics in Prometheus text format to this file instead of stdout')
+        observability.add_argument('--profile', action='store_true',
+                                   help='Run under cProfile and print the top functions by cumulative time')
+        observability.add_argument('--profile_output', type=str, help='With --profile, also save the raw profile here')
+        observability.add_argument('--detect_anomalies', action='store_true',
+                                   help='Alert on 4xx/5xx rate spikes, per-IP request bursts and per-path '
+                                        'error ratios while loading (stored in the anomalies table on MySQL)')
+        observability.add_argument('--anomalies_file', type=str,
+                                   help='Append anomaly alerts to this JSON Lines file (implies --detect_anomalies)')
+
     # Command to process logs
-        process_parser = subparsers.add_parser('process_logs', help='Load logs from a file')
-        process_parser.add_argument('file_path', type=str, help='Path to log file')
-        process_parser.add_argument('--batch_size', type=int, default=1000, help='Insert batch size')
+        process_parser = subparsers.add_parser('process_logs', parents=[observability], help='Load logs from a file')
+        process_parser.add_argument('file_paths', type=str, nargs='+',
+                                    help='Log files, directories or glob patterns (plain, .gz, .bz2, .xz or .zst)')
+        process_parser.add_argument('--batch_size', type=int,
+                                    help='Insert batch size (default: [ingest] batch_size, or 1000)')
+        process_parser.add_argument('--batches_per_commit', type=int,
+                                    help='Batches committed per transaction (default: [ingest] batches_per_commit, or 1)')
+        process_parser.add_argument('--adaptive', action='store_true',
+                                    help='Tune batch size and batches per commit from measured insert latency')
+        process_parser.add_argument('--target_rate', type=int,
+                                    help='With --adaptive, stop tuning at this many rows/sec '
+                                         '(default: [ingest] target_rows_per_sec)')
+        process_parser.add_argument('--workers', type=int, default=1,
+                                    help='Parse the file in N processes (byte-range sharding)')
+        process_parser.add_argument('--writers', type=int, default=1,
+                                    help='Insert batches from N threads, each on its own connection')
+        process_parser.add_argument('--queue_size', type=int, default=DEFAULT_QUEUE_BATCHES,
+                                    help='Parsed batches buffered ahead of the writers')
+        process_parser.add_argument('--mmap', action='store_true',
+                                    help='Parse uncompressed files with a bytes regex over a memory map (one process; '
+                                         'default log format only)')
+        process_parser.add_argument('--bulk', action='store_true',
+                                    help='Load through LOAD DATA LOCAL INFILE instead of batched INSERTs')
+        process_parser.add_argument('--defer_checks', action='store_true',
+                                    help='With --bulk, disable FK/unique checks and key maintenance during the load')
+        process_parser.add_argument('--resume', action='store_true',
+                                    help='Skip the byte ranges of each file that earlier runs committed')
+        process_parser.add_argument('--rejects', type=str,
+                                    help='Append malformed lines to this file (written in bulk)')
+
+    # Command to follow growing log files
+        follow_parser = subparsers.add_parser('follow_logs', parents=[observability],
+                                              help='Tail log files and load new lines continuously')
+        follow_parser.add_argument('file_paths', type=str, nargs='+', help='Paths to log files')
+        follow_parser.add_argument('--batch_size', type=int, default=1000, help='Insert batch size')
+        follow_parser.add_argument('--flush_interval', type=float, default=2.0,
+                                   help='Seconds before a partial batch is committed')
+        follow_parser.add_argument('--from_start', action='store_true',
+                                   help='Read files without a checkpoint from the beginning instead of the end')
+        follow_parser.add_argument('--rejects', type=str,
+                                   help='Append malformed lines to this file (written in bulk)')
+
+    # Command to recompute the report rollup tables
+        subparsers.add_parser('rebuild_rollups', help='Rebuild report rollup tables from log_entries')
+
+    # Command to serve the dashboard and its report endpoints
+        serve_parser = subparsers.add_parser('serve', help='Serve the web dashboard and its JSON report API')
+        serve_parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to listen on')
+        serve_parser.add_argument('--port', type=int, default=8000, help='Port to listen on')
+
+    # Command to show report cache effectiveness
+        subparsers.add_parser('cache_stats', help='Show report cache hits, misses and entries')
+
+    # Commands for schema migrations and index checks
+        subparsers.add_parser('migrate', help='Apply pending schema migrations (indexes, partitions)')
+        explain_parser = subparsers.add_parser('explain_reports', help='Show index use of the error-log report queries')
+        explain_parser.add_argument('--date', type=str, help='Date in YYYY-MM-DD format (default: today)')
 
     # Command to generate reports
         report_parser = subparsers.add_parser('generate_report', help='Generate reports')
         report_subs = report_parser.add_subparsers(dest='report_type', help='Report types')
 
-        report_subs.add_parser('status_code_distribution', help='Show status code breakdown')
-        report_subs.add_parser('hourly_traffic', help='Show hourly traffic volume')
-        report_subs.add_parser('os_distribution', help='Show OS traffic breakdown')
+        # Output format shared by every report type
+        output = argparse.ArgumentParser(add_help=False)
+        output.add_argument('--format', choices=['table', 'csv', 'jsonl'], default='table',
+                            help='table buffers all rows; csv and jsonl stream them row by row')
+        output.add_argument('--from-file', dest='from_file', type=str, nargs='+',
+                            help='Report straight from log files instead of the database')
+        output.add_argument('--epsilon', type=float, default=DEFAULT_EPSILON,
+                            help='With --from-file, max overcount of top IPs/URLs as a fraction of all requests')
 
-        top_ips = report_subs.add_parser('top_n_ips', help='Top IPs by request count')
+        report_subs.add_parser('status_code_distribution', parents=[output], help='Show status code breakdown')
+        report_subs.add_parser('hourly_traffic', parents=[output], help='Show hourly traffic volume')
+        report_subs.add_parser('os_distribution', parents=[output], help='Show OS traffic breakdown')
+        report_subs.add_parser('method_distribution', parents=[output], help='Show HTTP method breakdown')
+        report_subs.add_parser('table_sizes', parents=[output], help='Show row counts and storage per table')
+
+        top_ips = report_subs.add_parser('top_n_ips', parents=[output], help='Top IPs by request count')
         top_ips.add_argument('n', type=int, help='Number of IPs to show')
 
-        top_urls = report_subs.add_parser('top_n_urls', help='Top requested URLs')
+        top_urls = report_subs.add_parser('top_n_urls', parents=[output], help='Top requested URLs')
         top_urls.add_argument('n', type=int, help='Number of URLs to show')
 
-        error_logs = report_subs.add_parser('error_logs', help='Logs for specific HTTP error code')
+        error_logs = report_subs.add_parser('error_logs', parents=[output], help='Logs for specific HTTP error code')
         error_logs.add_argument('status_code', type=int, help='Error status code (e.g., 404)')
 
     # ✅ New: Error logs filtered by specific date
-        error_logs_by_date = report_subs.add_parser('error_logs_by_date', help='Logs for all errors on a specific date')
+        error_logs_by_date = report_subs.add_parser('error_logs_by_date', parents=[output],
+                                                    help='Logs for all errors on a specific date')
         error_logs_by_date.add_argument('date', type=str, help='Date in YYYY-MM-DD format')
+
+        snapshot = report_subs.add_parser('all', parents=[output],
+                                          help='Dashboard snapshot: every dashboard report, run concurrently '
+                                               '(with --from-file, every report the files support)')
+        snapshot.add_argument('--n', type=int, default=10, help='Rows in the top IPs/URLs reports')
+        snapshot.add_argument('--compare', action='store_true',
+                              help='Also run the reports serially and log both wall-clock times')
         
-    def run(self):
-        args = self.parser.parse_args()
+    def run(self, args=None):
+        args = args or self.parser.parse_args()
+
+        if args.command == 'generate_report' and getattr(args, 'from_file', None):
+            file_paths = self._existing_files(args.from_file)
+            if not file_paths:
+                sys.exit(1)
+            try:
+                report = FileReport.from_files(file_paths, args.epsilon)
+            except Exception as e:
+                # Unreadable files, and corrupt or truncated compressed ones
+                logging.error(f"Could not read log file: {e}")
+                sys.exit(1)
+            self._generate_report(args, report)
+            return
 
+        if not self.db_handler.uses_migrations:
+            if args.command in ('migrate', 'explain_reports'):
+                logging.warning(f"{args.command} only applies to the MySQL backend.")
+                return
+        elif args.command not in (None, 'migrate') and pending_migrations(self.db_handler):
+            logging.error("Database schema is out of date; run `python main.py migrate` first.")
+            return
+
+        reporter = None
+        if getattr(args, 'metrics_interval', None) or getattr(args, 'metrics_file', None):
+            reporter = MetricsReporter(interval=args.metrics_interval or DEFAULT_INTERVAL,
+                                       textfile=args.metrics_file).start()
+        try:
+            with profiled(args.profile_output) if getattr(args, 'profile', False) else nullcontext():
+                self._run_command(args)
+        finally:
+            if reporter is not None:
+                reporter.stop()
+
+    def _run_command(self, args):
         if args.command == 'process_logs':
-            self._process_logs(args.file_path, args.batch_size)
+            if not self._process_logs(args.file_paths, args.batch_size or 1000, args.workers, args.bulk,
+                                      args.defer_checks, args.mmap, args.writers, args.queue_size,
+                                      args.batches_per_commit or 1, args.adaptive, args.target_rate,
+                                      args.resume, args.rejects, self._anomaly_detector(args)):
+                sys.exit(1)
+        elif args.command == 'follow_logs':
+            LogFollower(self.db_handler, args.file_paths, args.batch_size, args.flush_interval,
+                        from_start=args.from_start, malformed_lines=MalformedLines(args.rejects),
+                        anomaly_detector=self._anomaly_detector(args)).run()
+        elif args.command == 'rebuild_rollups':
+            self.db_handler.rebuild_rollups()
+        elif args.command == 'serve':
+            ReportServer(self.db_handler, args.host, args.port,
+                         workers=getattr(self.db_handler, 'pool_size', 4)).run()
+        elif args.command == 'cache_stats':
+            cache = getattr(self.db_handler, 'report_cache', None)
+            if cache is None:
+                logging.warning("Report cache is not enabled; set [report_cache] file in config.ini.")
+            else:
+                print(tabulate([cache.stats()], headers="keys", tablefmt="grid"))
+        elif args.command == 'migrate':
+            migrate(self.db_handler)
+        elif args.command == 'explain_reports':
+            plans = self.db_handler.explain_report_queries(date_str=args.date)
+            print(tabulate(plans, headers=['report', 'table', 'partitions', 'key', 'rows', 'extra'], tablefmt="grid"))
+            for report, partitions in self.db_handler.unpruned_date_queries(args.date):
+                logging.warning(f"{report} is not pruned to the day's partitions; it reads {partitions}")
         elif args.command == 'generate_report':
             self._generate_report(args)
         else:
             self.parser.print_help()
 
-    def _process_logs(self, file_path, batch_size):
-        log_parser = LogParser()
-        batch, total = [], 0
+    def _anomaly_detector(self, args):
+        """Returns an AnomalyDetector for --detect_anomalies/--anomalies_file, or None.
+
+        Alerts go to the JSON Lines file if given, otherwise to the anomalies
+        table; the columnar backend has no such table, so there they are only
+        logged.
+        """
+        if not (args.detect_anomalies or args.anomalies_file):
+            return None
+        if args.anomalies_file:
+            return AnomalyDetector(JsonlAnomalySink(args.anomalies_file))
+        if self.db_handler.uses_migrations:
+            return AnomalyDetector(TableAnomalySink(self.db_handler))
+        logging.warning("The columnar backend has no anomalies table; alerts are only logged "
+                        "(use --anomalies_file to keep them)")
+        return AnomalyDetector()
+
+    @staticmethod
+    def _existing_files(file_patterns):
+        """Expands files, directories and globs, logging an error for each path that is not a file."""
+        file_paths = []
+        for file_path in expand_paths(file_patterns):
+            if os.path.isfile(file_path):
+                file_paths.append(file_path)
+            else:
+                logging.error(f"File not found: {file_path}")
+        return file_paths
+
+    def _read_batches(self, file_path, batch_size, workers=1, use_mmap=False, source_file=None, committed=None,
+                      malformed_lines=None):
+        """Parses one plain or compressed log file, yielding SourceBatches.
+
+        With committed ranges from the manifest, reading starts at the end of
+        the committed prefix and rows in later committed ranges are dropped.
+        Logs the file's throughput once it has been consumed, so the time
+        includes loading the batches as well as reading and parsing them.
+        """
+        started = time.perf_counter()
+        start = committed.resume_offset if committed else 0
+        source = LogSource(file_path, start)
+        entries = 0
+        if start:
+            logging.info(f"Resuming {file_path} at byte {start}")
+
+        mmap_reader = None
+        if use_mmap and source.compression is None:
+            mmap_reader = MmapLogReader(malformed_lines)
+            if not mmap_reader.combined_format:
+                logging.warning(f"--mmap only parses the default log format; parsing {file_path} "
+                                f"line by line with the [log] regex from config.ini")
+                mmap_reader = None
+        if mmap_reader is not None:
+            batches = mmap_reader.iter_batches(file_path, batch_size, start)
+        elif workers > 1 and source.compression is None:
+            batches = iter_parsed_batches(file_path, batch_size, workers, start, malformed_lines)
+        else:
+            if workers > 1:
+                logging.info(f"{file_path} is {source.compression}-compressed; parsing it in one process")
+            batches = self._parse_lines(source, batch_size, malformed_lines)
+
+        for batch in batches:
+            batch.source = source_file
+            if committed and committed.has_gaps:
+                committed.drop_committed(batch)
+                if not batch:
+                    continue
+            entries += len(batch)
+            yield batch
+
+        elapsed = time.perf_counter() - started
+        size_mb = (source.stats['bytes'] or max(os.path.getsize(file_path) - start, 0)) / 1048576
+        logging.info(f"{file_path} ({source.compression or 'plain'}): {entries} entries, {size_mb:.1f} MB "
+                     f"in {elapsed:.2f}s ({size_mb / elapsed if elapsed else 0:.1f} MB/s, "
+                     f"{entries / elapsed if elapsed else 0:.0f} rows/sec)")
+
+    def _parse_lines(self, source, batch_size, malformed_lines=None):
+        """Parses a LogSource's lines one by one, yielding SourceBatches."""
+        log_parser = LogParser(malformed_lines)
+        batch = SourceBatch(start=source.start)
+
+        for offset, line in source.lines_with_offsets():
+            parsed = log_parser.parse_line(line)
+            if parsed:
+                if len(batch) >= batch_size:
+                    # The batch covers everything up to this line
+                    batch.end = offset
+                    log_parser.report_metrics()
+                    yield batch
+                    batch = SourceBatch(start=offset)
+                batch.append(parsed)
+                batch.offsets.append(offset)
+        batch.end = source.position
+        log_parser.report_metrics()
+        if batch:
+            yield batch
+
+    def _process_logs(self, file_patterns, batch_size, workers=1, bulk=False, defer_checks=False,
+                      use_mmap=False, writers=1, queue_size=DEFAULT_QUEUE_BATCHES, batches_per_commit=1,
+                      adaptive=False, target_rate=None, resume=False, rejects=None, anomaly_detector=None):
+        """Parses and loads the files; returns False if the load was stopped by an error.
+
+        batch_size is also the size of the parsed batches; with adaptive the
+        writers regroup them as the tuned batch size changes. The load is
+        recorded as an ingest run; with resume, byte ranges that earlier runs
+        committed are not read again. Malformed lines are summarised at the
+        end, and appended to the rejects file if given. With an anomaly
+        detector, every parsed batch is fed to it on its way to the writers.
+        """
+        total = 0
+        started = time.perf_counter()
 
+        file_paths = self._existing_files(file_patterns)
+        if not file_paths:
+            if anomaly_detector is not None:
+                anomaly_detector.close()
+            return False
+
+        if resume and not self.db_handler.uses_migrations:
+            logging.warning("--resume needs the ingest manifest of the MySQL backend; loading everything")
+        # Before any writer connection opens a transaction on log_entries
+        top_up_partitions(self.db_handler)
+
+        # Fingerprints and committed ranges are read before any writer uses the connection
+        sources = []
+        for file_path in file_paths:
+            try:
+                compression = detect_compression(file_path)
+                source_file = SourceFile(file_path, file_fingerprint(file_path, compression))
+            except Exception as e:
+                # Unreadable or corrupt (BadGzipFile, EOFError, ...) or zstandard is not installed
+                logging.error(f"Skipping {file_path}: could not read it: {e}")
+                continue
+            committed = None
+            if resume:
+                committed = CommittedRanges(self.db_handler.committed_ranges(source_file.fingerprint))
+                if (compression is None and not committed.has_gaps
+                        and committed.resume_offset >= os.path.getsize(file_path) > 0):
+                    logging.info(f"{file_path} is already loaded; skipping it")
+                    continue
+            sources.append((source_file, committed))
+
+        malformed_lines = MalformedLines(rejects)
+        batches = (batch for source_file, committed in sources
+                   for batch in self._read_batches(source_file.path, batch_size, workers, use_mmap,
+                                                   source_file, committed, malformed_lines))
+        if anomaly_detector is not None:
+            batches = anomaly_detector.observe_batches(batches)
+
+        run_id = self.db_handler.start_ingest_run()
+        status = 'failed'
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                for line in f:
-                    parsed = log_parser.parse_line(line)
-                    if parsed:
-                        batch.append(parsed)
-                        if len(batch) >= batch_size:
-                            self.db_handler.insert_batch_log_entries(batch)
-                            total += len(batch)
-                            batch = []
-                if batch:
-                    self.db_handler.insert_batch_log_entries(batch)
-                    total += len(batch)
-            logging.info(f"Finished processing log file. Total lines loaded: {total}")
-        except FileNotFoundError:
-            logging.error(f"File not found: {file_path}")
+            if bulk:
+                # Parsing runs ahead in a thread while each TSV is loaded
+                total = self.db_handler.bulk_load_log_entries(prefetch(batches, queue_size), defer_checks)
+            else:
+                if adaptive:
+                    settings = AdaptiveBatchSettings(batch_size, batches_per_commit, target_rate,
+                                                     self.db_handler.max_insert_rows(), writers)
+                else:
+                    settings = BatchSettings(batch_size, batches_per_commit)
+                total = IngestPipeline(self.db_handler, writers, queue_size, settings).run(batches)
+            elapsed = time.perf_counter() - started
+            status = 'completed'
+            logging.info(f"Finished processing {len(sources)} log file(s). Total lines loaded: {total}")
+            logging.info(f"{'Bulk' if bulk else 'Batched insert'} path: {elapsed:.2f}s "
+                         f"({total / elapsed if elapsed else 0:.0f} rows/sec)")
+            return True
         except Exception as e:
             logging.error(f"Error while processing logs: {e}")
+            return False
+        finally:
+            malformed_lines.summary()
+            if anomaly_detector is not None:
+                anomaly_detector.close()
+            if run_id is not None:
+                try:
+                    rows, new_rows = self.db_handler.finish_ingest_run(status)
+                    logging.info(f"Ingest run {run_id} {status}: {new_rows} new rows, "
+                                 f"{rows - new_rows} already loaded")
+                except Exception as e:
+                    logging.error(f"Could not record the end of ingest run {run_id}: {e}")
 
-    def _generate_report(self, args):
-        fetch = self.db_handler
+    def _generate_report(self, args, fetch=None):
+        fetch = fetch or self.db_handler
 
         report_map = {
             'status_code_distribution': lambda: fetch.get_status_code_distribution(),
             'hourly_traffic': lambda: fetch.get_hourly_traffic(),
             'os_distribution': lambda: fetch.get_os_distribution(),
+            'method_distribution': lambda: fetch.get_method_distribution(),
+            'table_sizes': lambda: fetch.get_table_sizes(),
             'top_n_ips': lambda: fetch.get_top_n_ips(args.n),
             'top_n_urls': lambda: fetch.get_top_n_requested_urls(args.n),
             'error_logs': lambda: fetch.get_error_logs(args.status_code),
             'error_logs_by_date': lambda: fetch.get_error_logs_by_date(args.date)
         }
 
+        if args.report_type == 'all':
+            if isinstance(fetch, FileReport):
+                self._file_snapshot(args, fetch)
+            else:
+                self._dashboard_snapshot(args)
+            return
+
         if args.report_type not in report_map:
             logging.warning("Invalid report type specified.")
             return
+        if isinstance(fetch, FileReport) and args.report_type not in FILE_REPORT_TYPES:
+            logging.warning(f"{args.report_type} needs the database and is not available with --from-file.")
+            return
 
         results = report_map[args.report_type]()
+        if args.format != 'table':
+            if not self._stream_rows(results, args.format):
+                logging.warning("No data available for this report.")
+            return
+
+        results = list(results)
         if results:
             print(tabulate(results, headers="keys", tablefmt="grid"))
         else:
             print("No data available for this report.")
 
+    def _dashboard_snapshot(self, args):
+        """Runs the reports behind the web dashboard at once on pooled connections."""
+        reports = {
+            'top_ips': ('get_top_n_ips', (args.n,)),
+            'status_codes': ('get_status_code_distribution', ()),
+            'os_distribution': ('get_os_distribution', ()),
+            'hourly_traffic': ('get_hourly_traffic', ()),
+            'top_urls': ('get_top_n_requested_urls', (args.n,)),
+        }
+
+        if args.compare:
+            started = time.perf_counter()
+            self.db_handler.run_reports(reports, concurrent=False)
+            serial = time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = self.db_handler.run_reports(reports)
+        concurrent = time.perf_counter() - started
+
+        if args.compare:
+            logging.info(f"Serial: {serial:.3f}s, concurrent: {concurrent:.3f}s "
+                         f"({serial / concurrent if concurrent else 0:.1f}x)")
+
+        self._print_sections(results, args.format)
+
+    def _file_snapshot(self, args, report):
+        """Runs every report FileReport supports (FILE_REPORT_TYPES) over the already parsed files."""
+        reports = {
+            'top_ips': lambda: report.get_top_n_ips(args.n),
+            'status_codes': report.get_status_code_distribution,
+            'hourly_traffic': report.get_hourly_traffic,
+            'method_distribution': report.get_method_distribution,
+            'top_urls': lambda: report.get_top_n_requested_urls(args.n),
+        }
+        self._print_sections({label: list(fetch()) for label, fetch in reports.items()}, args.format)
+
+    def _print_sections(self, results, fmt):
+        """Prints {label: rows} as one JSON object, or one CSV section or table per report."""
+        if fmt == 'jsonl':
+            sys.stdout.write(json.dumps(results, default=str) + '\n')
+            return
+
+        for label, rows in results.items():
+            if fmt == 'csv':
+                sys.stdout.write(f"# {label}\n")
+                self._stream_rows(rows, 'csv')
+            else:
+                print(f"\n{label}")
+                print(tabulate(rows, headers="keys", tablefmt="grid") if rows else "No data available for this report.")
+
+    def _stream_rows(self, rows, fmt):
+        """Writes rows to stdout as CSV or JSON lines as they arrive; returns the row count."""
+        count = 0
+        writer = csv.writer(sys.stdout) if fmt == 'csv' else None
+
+        for row in rows:
+            if writer:
+                if count == 0 and isinstance(row, dict):
+                    writer.writerow(row.keys())
+                writer.writerow(row.values() if isinstance(row, dict) else row)
+            else:
+                sys.stdout.write(json.dumps(row, default=str) + '\n')
+            count += 1
+
+        return count
+
 
 def main():
+    cli = CLIManager(None)
+    args = cli.parser.parse_args()
+    if args.command == 'generate_report' and getattr(args, 'from_file', None):
+        # Reads only the log files; no database connection is opened
+        cli.run(args)
+        return
+
     config = configparser.ConfigParser()
     config.read('config.ini')
 
-    db_cfg = config['mysql']
-    db_handler = MySQLHandler(**db_cfg)
-    db_handler.create_tables()
+    if args.command == 'process_logs':
+        # Command-line options win over settings pinned in config.ini
+        if args.batch_size is None:
+            args.batch_size = config.getint('ingest', 'batch_size', fallback=1000)
+        if args.batches_per_commit is None:
+            args.batches_per_commit = config.getint('ingest', 'batches_per_commit', fallback=1)
+        if args.target_rate is None:
+            args.target_rate = config.getint('ingest', 'target_rows_per_sec', fallback=None)
+
+    ua_classifier = UserAgentClassifier(
+        cache_path=config.get('user_agents', 'cache_file', fallback=None),
+        workers=config.getint('user_agents', 'workers', fallback=0)
+    )
 
-    cli = CLIManager(db_handler)
-    cli.run()
+    backend = config.get('storage', 'backend', fallback='mysql')
+    if backend == 'columnar':
+        # pyarrow is only needed for this backend
+        from columnar_handler import ColumnarHandler
+        db_handler = ColumnarHandler(config.get('storage', 'data_dir', fallback='columnar_data'),
+                                     ua_classifier=ua_classifier)
+    else:
+        report_cache = None
+        if config.has_option('report_cache', 'file'):
+            report_cache = ReportCache(
+                config.get('report_cache', 'file'),
+                ttl=config.getfloat('report_cache', 'ttl', fallback=DEFAULT_TTL),
+                max_entries=config.getint('report_cache', 'max_entries', fallback=DEFAULT_MAX_ENTRIES)
+            )
+        db_cfg = config['mysql']
+        db_handler = MySQLHandler(**db_cfg, ua_classifier=ua_classifier, report_cache=report_cache)
+    db_handler.create_tables()
+    db_handler.load_user_agent_cache()
 
-    db_handler.close()
+    cli.db_handler = db_handler
+    try:
+        cli.run(args)
+    finally:
+        db_handler.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,165 @@
+# malformed_lines.py
+
+import math
+import time
+import random
+import logging
+from collections import Counter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Example malformed lines kept for the end-of-run summary
+SAMPLE_SIZE = 5
+
+# Malformed lines logged one by one per LOG_INTERVAL seconds; the rest are only counted
+LOG_LIMIT = 10
+LOG_INTERVAL = 60.0
+
+# Rejected lines buffered before they are appended to the rejects file
+REJECT_BUFFER_LINES = 10000
+
+# Characters of a line shown in a log message
+LINE_PREVIEW = 200
+
+
+def _preview(line):
+    line = line.rstrip('\r\n')
+    return line if len(line) <= LINE_PREVIEW else line[:LINE_PREVIEW] + '...'
+
+
+class MalformedLines:
+    """Counts malformed lines by category, keeps a sample of them and optionally collects the rejects.
+
+    Handling a malformed line costs about as much as parsing a good one: it
+    is counted, taken into a reservoir sample with Li's Algorithm L (which
+    draws random numbers only when a line is actually kept), appended to a
+    buffer written out REJECT_BUFFER_LINES at a time, and logged only for the
+    first LOG_LIMIT lines in each LOG_INTERVAL seconds. summary() reports
+    the rest at the end of a run, so a wrong-format file loads at full speed
+    instead of writing one warning per line.
+
+    Parse workers keep their own instance and send take() back with their
+    entries; merge() adds it to the reader's instance.
+    """
+
+    def __init__(self, rejects_path=None, sample_size=SAMPLE_SIZE, log_limit=LOG_LIMIT,
+                 log_interval=LOG_INTERVAL, keep_rejects=False):
+        self.rejects_path = rejects_path
+        self.keep_rejects = keep_rejects or rejects_path is not None
+        self.sample_size = sample_size
+        self.log_limit = log_limit
+        self.log_interval = log_interval
+        self.counts = Counter()
+        self.seen = 0
+        self.sample = []
+        self.rejects = []
+        self.rejects_written = 0
+        self._rng = random.Random()
+        self._next_sampled = sample_size
+        self._weight = 1.0
+        self._window_ends = 0.0
+        self._window_logged = 0
+        self._window_suppressed = 0
+
+    def __bool__(self):
+        return self.seen > 0
+
+    def add(self, category, line):
+        """Records one malformed line."""
+        self.counts[category] += 1
+        self.seen += 1
+
+        if len(self.sample) < self.sample_size:
+            self.sample.append((category, line))
+            if len(self.sample) == self.sample_size:
+                self._skip()
+        elif self.seen == self._next_sampled:
+            self.sample[self._rng.randrange(self.sample_size)] = (category, line)
+            self._skip()
+
+        if self.keep_rejects:
+            self.rejects.append(line if line.endswith('\n') else line + '\n')
+            if self.rejects_path and len(self.rejects) >= REJECT_BUFFER_LINES:
+                self.flush_rejects()
+
+        now = time.monotonic()
+        if now >= self._window_ends:
+            if self._window_suppressed:
+                logging.warning(f"{self._window_suppressed} more malformed lines in the last "
+                                f"{self.log_interval:g}s were not logged")
+            self._window_ends = now + self.log_interval
+            self._window_logged = self._window_suppressed = 0
+        if self._window_logged < self.log_limit:
+            self._window_logged += 1
+            logging.warning(f"Malformed log line skipped ({category}): {_preview(line)}")
+        else:
+            self._window_suppressed += 1
+
+    def _skip(self):
+        """Picks the number of the next line taken into the full sample (Algorithm L)."""
+        self._weight *= math.exp(math.log(self._rng.random() or 1e-300) / self.sample_size)
+        gap = math.floor(math.log(self._rng.random() or 1e-300) / math.log1p(-self._weight))
+        self._next_sampled = self.seen + gap + 1
+
+    def take(self):
+        """Returns counts, sample and buffered rejects as a picklable dict, and starts over."""
+        state = {'counts': dict(self.counts), 'seen': self.seen, 'sample': self.sample, 'rejects': self.rejects}
+        self.counts = Counter()
+        self.seen = 0
+        self.sample = []
+        self.rejects = []
+        self._next_sampled = self.sample_size
+        self._weight = 1.0
+        return state
+
+    def merge(self, state):
+        """Adds a take() dict from another instance, without logging its lines again."""
+        if not state['seen']:
+            return
+        # Each kept example comes from either sample in proportion to the lines it stands for
+        ours, theirs = list(self.sample), list(state['sample'])
+        our_weight, their_weight = self.seen, state['seen']
+        merged = []
+        while len(merged) < self.sample_size and (ours or theirs):
+            if theirs and (not ours or self._rng.random() * (our_weight + their_weight) >= our_weight):
+                merged.append(theirs.pop(self._rng.randrange(len(theirs))))
+                their_weight = max(their_weight - 1, 0)
+            else:
+                merged.append(ours.pop(self._rng.randrange(len(ours))))
+                our_weight = max(our_weight - 1, 0)
+        self.sample = merged
+        self.counts.update(state['counts'])
+        self.seen += state['seen']
+        if len(self.sample) == self.sample_size:
+            self._next_sampled = self.seen
+            self._skip()
+
+        if self.keep_rejects:
+            self.rejects.extend(state['rejects'])
+            if self.rejects_path and len(self.rejects) >= REJECT_BUFFER_LINES:
+                self.flush_rejects()
+
+    def flush_rejects(self):
+        """Appends the buffered rejects to the rejects file in one write."""
+        if not self.rejects or not self.rejects_path:
+            return
+        try:
+            with open(self.rejects_path, 'a', encoding='utf-8', errors='replace') as f:
+                f.writelines(self.rejects)
+            self.rejects_written += len(self.rejects)
+        except OSError as e:
+            logging.error(f"Could not write rejected lines to {self.rejects_path}: {e}")
+        self.rejects = []
+
+    def summary(self):
+        """Flushes the rejects and logs the counts by category and the sampled examples."""
+        self.flush_rejects()
+        if not self.seen:
+            return
+        by_category = ', '.join(f"{category} {count}" for category, count in self.counts.most_common())
+        logging.warning(f"Skipped {self.seen} malformed lines ({by_category})")
+        for category, line in self.sample:
+            logging.warning(f"  e.g. ({category}): {_preview(line)}")
+        if self.rejects_written:
+            logging.info(f"{self.rejects_written} rejected lines written to {self.rejects_path}")
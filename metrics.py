@@ -0,0 +1,225 @@
+# metrics.py
+
+import io
+import os
+import sys
+import time
+import bisect
+import pstats
+import cProfile
+import logging
+import functools
+import threading
+import inspect
+from contextlib import contextmanager
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implied
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Seconds between periodic metrics outputs
+DEFAULT_INTERVAL = 10.0
+
+# Functions listed by --profile
+PROFILE_TOP = 25
+
+
+class _Histogram:
+    """Counts of observations per latency bucket, with their sum."""
+
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (inf if past the last bound)."""
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+
+def _label_text(labels):
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}' if labels else ''
+
+
+class Metrics:
+    """Counters and latency histograms keyed by name and labels, safe to update from several threads.
+
+    Updates are made per batch, statement or report, never per line, so
+    keeping them costs well under a percent of a load. Line-level counts are
+    kept in plain attributes by their owners (see LogParser.take_stats) and
+    added here a batch at a time.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observes the seconds spent in the with block, also when it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started = time.time()
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, (list(h.counts), h.sum, h.count)) for key, h in self._histograms.items())
+
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_label_text(labels)} {value}")
+
+        for (name, labels), (counts, total, count) in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(LATENCY_BUCKETS + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels)} {total:.6f}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """One human-readable line per metric: counter values, and count/total/mean/p50/p95 of histograms."""
+        lines = [f"metrics after {time.time() - self.started:.1f}s"]
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                lines.append(f"  {name}{_label_text(labels)} = {value}")
+            for (name, labels), h in sorted(self._histograms.items()):
+                mean = h.sum / h.count if h.count else 0
+                lines.append(f"  {name}{_label_text(labels)}: n={h.count} total={h.sum:.3f}s "
+                             f"mean={mean * 1000:.2f}ms p50<={h.quantile(0.5) * 1000:g}ms "
+                             f"p95<={h.quantile(0.95) * 1000:g}ms")
+        return '\n'.join(lines)
+
+
+# Process-wide registry that every stage reports to
+METRICS = Metrics()
+
+
+def timed_report(method):
+    """Observes a report method's duration as report_seconds{report=...}; generators are timed until exhausted."""
+    labels = {'report': method.__name__.removeprefix('get_')}
+
+    if inspect.isgeneratorfunction(method):
+        @functools.wraps(method)
+        def generator_wrapper(self, *args, **kwargs):
+            with METRICS.timer('report_seconds', **labels):
+                yield from method(self, *args, **kwargs)
+        return generator_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with METRICS.timer('report_seconds', **labels):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class MetricsReporter:
+    """Writes METRICS every interval seconds, and once more on stop().
+
+    With textfile set, the Prometheus text format is written there
+    atomically, ready for node_exporter's textfile collector; otherwise a
+    summary is printed to stdout.
+    """
+
+    def __init__(self, metrics=METRICS, interval=DEFAULT_INTERVAL, textfile=None):
+        self.metrics = metrics
+        self.interval = interval
+        self.textfile = textfile
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='metrics-reporter', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.emit()
+
+    def emit(self):
+        if self.textfile:
+            tmp_path = self.textfile + '.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    f.write(self.metrics.prometheus_text())
+                os.replace(tmp_path, self.textfile)
+            except OSError as e:
+                logging.warning(f"Could not write metrics to {self.textfile}: {e}")
+        else:
+            print(self.metrics.summary(), flush=True)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.emit()
+
+
+@contextmanager
+def profiled(output=None, top=PROFILE_TOP):
+    """Runs the with block under cProfile and prints its top functions by cumulative time.
+
+    With output set, the raw profile is also saved there for snakeviz or
+    pstats. Only the calling thread is profiled, which for process_logs is
+    the reader and parser; writer threads show up in the metrics.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(top)
+        sys.stdout.write(text.getvalue())
+        if output:
+            profiler.dump_stats(output)
+            logging.info(f"Profile saved to {output}")
@@ -0,0 +1,219 @@
+# migrations.py
+
+import logging
+from datetime import date, datetime, timedelta
+from mysql.connector import Error
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Daily partitions kept ahead of today so new rows never land in p_future
+PARTITION_DAYS_AHEAD = 7
+
+# Most daily partitions created when partitioning existing rows (MySQL allows 8192 in all);
+# older rows, and rows without a timestamp, go to the p_old catch-all
+MAX_INITIAL_PARTITIONS = 1000
+
+
+def _partition_definition(day):
+    """PARTITION clause holding all rows before the end of the given day."""
+    next_day = day + timedelta(days=1)
+    return f"PARTITION p{day:%Y%m%d} VALUES LESS THAN (TO_DAYS('{next_day:%Y-%m-%d}'))"
+
+
+def _partition_by_day(db_handler):
+    """Drops the user_agents FK and the id-only PK, which partitioning does not allow, then partitions by day.
+
+    Rows are not rewritten: the primary key becomes a plain index on id, so
+    timestamp may stay NULL, and RANGE puts NULL rows in the lowest
+    partition, p_old. Daily partitions start at the first day with rows, but
+    cover at most MAX_INITIAL_PARTITIONS days up to PARTITION_DAYS_AHEAD from
+    today; p_old also holds anything before that.
+    """
+    cursor = db_handler.cursor
+
+    cursor.execute("""
+        SELECT CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'log_entries'
+          AND REFERENCED_TABLE_NAME IS NOT NULL
+    """)
+    for row in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE log_entries DROP FOREIGN KEY {row['CONSTRAINT_NAME']}")
+
+    # A primary key would have to include timestamp and so make it NOT NULL; AUTO_INCREMENT only needs an index
+    cursor.execute("""
+        ALTER TABLE log_entries
+            DROP PRIMARY KEY,
+            ADD INDEX idx_id (id)
+    """)
+
+    cursor.execute("SELECT MIN(DATE(timestamp)) AS first_day FROM log_entries")
+    last_day = date.today() + timedelta(days=PARTITION_DAYS_AHEAD)
+    first_day = min(cursor.fetchone()['first_day'] or date.today(), last_day)
+    first_day = max(first_day, last_day - timedelta(days=MAX_INITIAL_PARTITIONS - 1))
+    days = [first_day + timedelta(days=i) for i in range((last_day - first_day).days + 1)]
+
+    partitions = [f"PARTITION p_old VALUES LESS THAN (TO_DAYS('{first_day:%Y-%m-%d}'))"]
+    partitions += [_partition_definition(day) for day in days]
+    partitions.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+    cursor.execute(f"""
+        ALTER TABLE log_entries
+        PARTITION BY RANGE (TO_DAYS(timestamp)) ({', '.join(partitions)})
+    """)
+
+
+# (version, description, SQL statements or a function taking the handler)
+MIGRATIONS = [
+    (1, 'Indexes for the error-log report predicates', [
+        """
+        ALTER TABLE log_entries
+            ADD INDEX idx_status_timestamp (status_code, timestamp),
+            ADD INDEX idx_timestamp (timestamp)
+        """,
+    ]),
+    (2, 'Indexed MD5 hash of path', [
+        """
+        ALTER TABLE log_entries
+            ADD COLUMN path_hash BINARY(16) AS (UNHEX(MD5(path))) STORED,
+            ADD INDEX idx_path_hash (path_hash)
+        """,
+    ]),
+    (3, 'RANGE partitioning of log_entries by day', _partition_by_day),
+    (4, 'Dictionary-encoded path/referrer and packed IP addresses', [
+        """
+        INSERT IGNORE INTO paths (path_hash, path)
+        SELECT path_hash, MIN(path) FROM log_entries
+        WHERE path IS NOT NULL
+        GROUP BY path_hash
+        """,
+        """
+        INSERT IGNORE INTO referrers (referrer_hash, referrer)
+        SELECT UNHEX(MD5(referrer)) AS rh, MIN(referrer) FROM log_entries
+        WHERE referrer IS NOT NULL
+        GROUP BY rh
+        """,
+        """
+        ALTER TABLE log_entries
+            ADD COLUMN path_id INT AFTER method,
+            ADD COLUMN referrer_id INT AFTER bytes_sent,
+            ADD COLUMN ip_packed VARBINARY(16) FIRST
+        """,
+        """
+        UPDATE log_entries le
+        LEFT JOIN paths p ON p.path_hash = le.path_hash
+        LEFT JOIN referrers r ON r.referrer_hash = UNHEX(MD5(le.referrer))
+        SET le.path_id = p.id, le.referrer_id = r.id, le.ip_packed = INET6_ATON(le.ip_address)
+        """,
+        """
+        ALTER TABLE log_entries
+            DROP INDEX idx_path_hash,
+            DROP COLUMN path_hash,
+            DROP COLUMN path,
+            DROP COLUMN referrer,
+            DROP COLUMN ip_address,
+            CHANGE ip_packed ip_address VARBINARY(16),
+            ADD INDEX idx_path_id (path_id)
+        """,
+    ]),
+    (5, 'Unique row hash for idempotent re-ingestion', [
+        # The unique key must include the partitioning column; the hash covers the timestamp anyway
+        """
+        ALTER TABLE log_entries
+            ADD COLUMN row_hash BIGINT UNSIGNED,
+            ADD UNIQUE KEY uq_row_hash (row_hash, timestamp)
+        """,
+    ]),
+    # Since migration 3 dropped the primary key, idx_timestamp no longer ends
+    # in id, and the keyset order (timestamp, id) of the paged error-log
+    # report sorted each page's whole day
+    (6, 'Index in keyset order for the paged error-log report', [
+        """
+        ALTER TABLE log_entries
+            ADD INDEX idx_timestamp_id (timestamp, id),
+            DROP INDEX idx_timestamp
+        """,
+    ]),
+]
+
+
+def _applied_versions(db_handler):
+    db_handler.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255),
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    db_handler.cursor.execute("SELECT version FROM schema_migrations")
+    return {row['version'] for row in db_handler.cursor.fetchall()}
+
+
+def pending_migrations(db_handler):
+    """Returns the versions that have not been applied yet."""
+    applied = _applied_versions(db_handler)
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+
+def ensure_daily_partitions(db_handler, days_ahead=PARTITION_DAYS_AHEAD):
+    """Splits p_future so there is a daily partition up to days_ahead from today."""
+    cursor = db_handler.cursor
+    cursor.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'log_entries'
+          AND PARTITION_NAME IS NOT NULL AND PARTITION_NAME NOT IN ('p_old', 'p_future')
+    """)
+    names = [row['PARTITION_NAME'] for row in cursor.fetchall()]
+    if not names:
+        return
+
+    last_day = max(datetime.strptime(name[1:], '%Y%m%d').date() for name in names)
+    target = date.today() + timedelta(days=days_ahead)
+    new_days = [last_day + timedelta(days=i) for i in range(1, (target - last_day).days + 1)]
+    if not new_days:
+        return
+
+    partitions = [_partition_definition(day) for day in new_days]
+    partitions.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+    cursor.execute(f"ALTER TABLE log_entries REORGANIZE PARTITION p_future INTO ({', '.join(partitions)})")
+    logging.info(f"Added {len(new_days)} daily partitions up to {target}.")
+
+
+def top_up_partitions(db_handler):
+    """Runs ensure_daily_partitions() for loaders, logging a failure instead of raising.
+
+    Backends without migrations are skipped. Rows past the last daily
+    partition still land in p_future, so a failed top-up never stops a load.
+    """
+    if not db_handler.uses_migrations:
+        return
+    try:
+        ensure_daily_partitions(db_handler)
+    except Error as e:
+        logging.warning(f"Could not add daily partitions: {e}")
+
+
+def migrate(db_handler):
+    """Applies pending migrations in version order, then tops up daily partitions."""
+    applied = _applied_versions(db_handler)
+
+    for version, description, steps in MIGRATIONS:
+        if version in applied:
+            continue
+        logging.info(f"Applying migration {version}: {description}")
+        try:
+            if callable(steps):
+                steps(db_handler)
+            else:
+                for statement in steps:
+                    db_handler.cursor.execute(statement)
+            db_handler.cursor.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            db_handler.conn.commit()
+        except Error as e:
+            logging.error(f"Migration {version} failed: {e}")
+            raise
+
+    ensure_daily_partitions(db_handler)
+    logging.info("Schema is up to date.")
@@ -0,0 +1,159 @@
+# mmap_parser.py
+
+import re
+import mmap
+import logging
+from log_parser import LogParser, LogRecord, TIMESTAMP_CACHE_SIZE
+from log_sources import SourceBatch
+from metrics import METRICS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# The default Combined Log Format regex over bytes, anchored at each line start
+# and kept from matching across newlines, so finditer over a whole file finds
+# the same lines LogParser would parse one at a time.
+LINE_PATTERN = re.compile(
+    rb'^(?P<ip_address>\d{1,3}(?:\.\d{1,3}){3}) - - '
+    rb'\[(?P<timestamp>[^\]\n]+)\] '
+    rb'"(?P<method>[A-Z]+) (?P<path>[^\s]+) HTTP/\d(?:\.\d+)?" '
+    rb'(?P<status_code>\d{3}) (?P<bytes_sent>\d+|-) '
+    rb'"(?P<referrer>[^"\n]*)" '
+    rb'"(?P<user_agent>.*)"',
+    re.MULTILINE
+)
+
+
+# Already parsed parts of the mapping are dropped from memory in steps of this many bytes
+RELEASE_BYTES = 64 * 1024 * 1024
+
+
+def _release(buffer, start, end):
+    try:
+        buffer.madvise(mmap.MADV_DONTNEED, start, end - start)
+    except (AttributeError, OSError):
+        pass
+
+
+class MmapLogReader:
+    """Parses an uncompressed log file by running a bytes regex over a memory map of it.
+
+    Nothing is decoded until a line has matched, and then only its fields,
+    which go straight into a LogRecord. Only the default Combined Log Format
+    is supported; combined_format is False when config.ini sets its own
+    [log] regex, and callers should then parse line by line instead.
+    """
+
+    def __init__(self, malformed_lines=None):
+        self._log_parser = LogParser(malformed_lines)
+        self.combined_format = self._log_parser.combined_format
+        self._timestamps = {}
+        self.entries = 0
+        self.skipped = 0    # lines that did not match or had an unparseable timestamp
+        self._reported = (0, 0)
+
+    def _report_metrics(self):
+        """Adds the lines handled since the last call to METRICS."""
+        entries, skipped = self.entries - self._reported[0], self.skipped - self._reported[1]
+        METRICS.inc('parse_lines_total', entries + skipped, path='mmap')
+        for reason, count in self._log_parser.take_stats()['malformed'].items():
+            METRICS.inc('parse_malformed_total', count, reason=reason)
+        self._reported = (self.entries, self.skipped)
+
+    def _reject(self, lines, category=None):
+        """Passes rejected raw lines to the parser's MalformedLines."""
+        self.skipped += len(lines)
+        for raw in lines:
+            line = raw.decode('utf-8', errors='replace')
+            self._log_parser._reject(category or self._log_parser._no_match_category(line), line)
+
+    def _timestamp(self, raw):
+        """Returns the stored timestamp string for the raw bytes, or '' if unparseable."""
+        timestamp = self._timestamps.get(raw)
+        if timestamp is None:
+            text = raw.decode('ascii', errors='ignore')
+            timestamp = self._log_parser._parse_timestamp(text)
+            if timestamp is None:
+                try:
+                    timestamp = self._log_parser._strptime_timestamp(text)
+                except ValueError:
+                    timestamp = ''
+            # Capped like LogParser's cache, so logs of mostly unique seconds don't grow it without bound
+            if len(self._timestamps) >= TIMESTAMP_CACHE_SIZE:
+                self._timestamps.clear()
+            self._timestamps[raw] = timestamp
+        return timestamp
+
+    def iter_batches(self, file_path, batch_size, start=0):
+        """Yields SourceBatches of LogRecords in file order, batch_size at a time, from byte offset start."""
+        batch = SourceBatch(start=start)
+        offsets = batch.offsets
+        timestamp_of = self._timestamp
+        new_record = tuple.__new__
+
+        with open(file_path, 'rb') as f:
+            try:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                return  # empty file
+            try:
+                buffer.madvise(mmap.MADV_SEQUENTIAL)
+            except (AttributeError, OSError):
+                pass
+
+            with buffer:
+                previous_end = None
+                released = start - start % mmap.PAGESIZE
+                for match in LINE_PATTERN.finditer(buffer, start):
+                    line_start = match.start()
+                    if line_start - released >= RELEASE_BYTES:
+                        # Parsed pages are never read again; keep them out of the RSS
+                        end = line_start - line_start % mmap.PAGESIZE
+                        _release(buffer, released, end)
+                        released = end
+
+                    # Whole lines between two matches are lines the regex rejected
+                    gap = buffer[start if previous_end is None else previous_end:line_start]
+                    if gap.count(b'\n') > (previous_end is not None):
+                        lines = gap.split(b'\n')[:-1]
+                        self._reject(lines if previous_end is None else lines[1:])
+                    previous_end = match.end()
+
+                    if len(batch) >= batch_size:
+                        # The batch covers everything up to this line
+                        batch.end = line_start
+                        self._report_metrics()
+                        yield batch
+                        batch = SourceBatch(start=line_start)
+                        offsets = batch.offsets
+
+                    ip_address, raw_timestamp, method, path, status_code, bytes_sent, referrer, user_agent = match.groups()
+                    timestamp = timestamp_of(raw_timestamp)
+                    if not timestamp:
+                        self._reject([match.group(0)], 'bad_timestamp')
+                        continue
+                    batch.append(new_record(LogRecord, (
+                        ip_address.decode('ascii'),
+                        timestamp,
+                        method.decode('ascii'),
+                        path.decode('utf-8', errors='ignore'),
+                        int(status_code),
+                        int(bytes_sent) if bytes_sent != b'-' else 0,
+                        referrer.decode('utf-8', errors='ignore') or None,
+                        user_agent.decode('utf-8', errors='ignore') or None,
+                    )))
+                    offsets.append(line_start)
+                    self.entries += 1
+
+                # Lines after the last match, including an unterminated last line
+                lines = buffer[start if previous_end is None else previous_end:].split(b'\n')
+                if previous_end is not None:
+                    lines = lines[1:]
+                if lines and not lines[-1]:
+                    lines.pop()
+                self._reject(lines)
+                batch.end = len(buffer)
+
+        self._report_metrics()
+        if batch:
+            yield batch
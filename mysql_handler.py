@@ -1,31 +1,269 @@
 import mysql.connector
-from mysql.connector import Error
-from datetime import datetime
+from mysql.connector import Error, InterfaceError, OperationalError
+from mysql.connector.pooling import MySQLConnectionPool
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import copy
+import functools
 import logging
-from user_agents import parse as parse_ua
+import os
+import threading
+import time
+import hashlib
+import ipaddress
+import tempfile
+from collections import Counter
+from lru_cache import LRUCache
+from ua_classifier import UserAgentClassifier
+from ingest_manifest import row_hashes, batch_checksum
+from metrics import METRICS, timed_report
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Maximum number of user agent string -> id mappings kept in memory
+USER_AGENT_CACHE_SIZE = 100000
+
+# Maximum number of path / referrer -> id mappings kept in memory (each)
+DIMENSION_CACHE_SIZE = 200000
+
+# Rows written to one temporary TSV before it is loaded with LOAD DATA
+BULK_LOAD_ROWS = 500000
+
+# Rows per multi-row rollup upsert statement
+ROLLUP_UPSERT_ROWS = 1000
+
+# Share of max_allowed_packet a multi-row statement may fill, leaving room for escaping
+PACKET_FILL = 0.5
+
+# Upper bound on the SQL text of one escaped log_entries row
+LOG_ENTRY_ROW_BYTES = 192
+
+# Columns of the multi-row log_entries INSERT, in _entry_rows order
+LOG_ENTRY_COLUMNS = """
+    ip_address, timestamp, method, path_id, status_code,
+    bytes_sent, referrer_id, user_agent_id, row_hash
+"""
+
+# Escapes for LOAD DATA's default FIELDS ESCAPED BY '\\'
+_TSV_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+
+# Error-log report queries; module level so EXPLAIN can check the exact SQL
+ERROR_LOGS_QUERY = """
+    SELECT INET6_NTOA(le.ip_address) AS ip_address, p.path, le.status_code, le.timestamp
+    FROM log_entries le
+    LEFT JOIN paths p ON p.id = le.path_id
+    WHERE le.status_code = %s
+    ORDER BY le.timestamp DESC
+    LIMIT 100
+"""
+
+# Half-open timestamp range instead of DATE(timestamp) = %s, so the
+# timestamp index and daily partition pruning can be used. Rows are read in
+# keyset pages on (timestamp, id); {after} is empty for the first page.
+ERROR_LOGS_BY_DATE_QUERY = """
+    SELECT le.id, INET6_NTOA(le.ip_address) AS ip_address, p.path, le.status_code, le.timestamp
+    FROM log_entries le
+    LEFT JOIN paths p ON p.id = le.path_id
+    WHERE le.timestamp >= %s AND le.timestamp < %s AND le.status_code >= 400 {after}
+    ORDER BY le.timestamp DESC, le.id DESC
+    LIMIT %s
+"""
+
+# Keyset condition for the pages after the first: rows older than the last one seen
+ERROR_LOGS_BY_DATE_AFTER = "AND (le.timestamp < %s OR (le.timestamp = %s AND le.id < %s))"
+
+# Rows per keyset page for streamed reports
+REPORT_PAGE_SIZE = 10000
+
+# Attempts and delay (seconds) when reconnecting a lost connection
+RECONNECT_ATTEMPTS = 3
+RECONNECT_DELAY = 1
+
+
+def _day_range(date_str):
+    """Returns the [start, end) datetimes of a YYYY-MM-DD date."""
+    start = datetime.strptime(date_str, '%Y-%m-%d')
+    return start, start + timedelta(days=1)
+
+
+def _md5(value):
+    return hashlib.md5(value.encode('utf-8')).digest()
+
+
+def _warn_unresolved(table, expected, resolved):
+    """Logs dimension values whose upserted row a SELECT did not return; their rows get a NULL id."""
+    if resolved < expected:
+        logging.warning(f"{table}: {expected - resolved} of {expected} upserted values were not found; "
+                        f"their log entries get a NULL id")
+
+
+def _pack_ip(ip_address):
+    """Packs an IP address the way INET6_ATON does (4 bytes for IPv4, 16 for IPv6)."""
+    try:
+        return ipaddress.ip_address(ip_address).packed
+    except ValueError:
+        return None
+
+
+def _tsv_field(value):
+    if value is None:
+        return '\\N'
+    return str(value).translate(_TSV_ESCAPES)
+
+
+def _rollup_counts(records, rows):
+    """Aggregates LogRecords and their log_entries rows into per-hour counts for each rollup table.
+
+    IPs are counted by their packed form, so addresses that cannot be packed
+    are left out and others are shown as INET6_NTOA would, as rebuild_rollups does.
+    """
+    counts = {'status': Counter(), 'path': Counter(), 'ip': Counter(), 'user_agent': Counter()}
+
+    for record, row in zip(records, rows):
+        hour_bucket = record.timestamp[:13] + ':00:00'
+        ip_packed, user_agent_id = row[0], row[7]
+        counts['status'][(hour_bucket, record.status_code)] += 1
+        counts['path'][(hour_bucket, record.path)] += 1
+        if ip_packed is not None:
+            counts['ip'][(hour_bucket, ip_packed)] += 1
+        if user_agent_id is not None:
+            counts['user_agent'][(hour_bucket, user_agent_id)] += 1
+
+    return counts
+
+
+def _cached_report(method):
+    """Serves an aggregate report from the handler's report cache while its ingest generation is current."""
+    @functools.wraps(method)
+    def wrapper(self, *args):
+        if self.report_cache is None:
+            return method(self, *args)
+        generation = self.get_generation()
+        rows = self.report_cache.get(method.__name__, args, generation)
+        METRICS.inc('report_cache_total', result='miss' if rows is None else 'hit')
+        if rows is None:
+            # put() returns the rows as a hit would, so callers get one shape either way
+            rows = self.report_cache.put(method.__name__, args, generation, method(self, *args))
+        return rows
+    return wrapper
+
 
 class MySQLHandler:
     """Handles MySQL connection, insertion, and reporting."""
 
-    def __init__(self, host, user, password, database, port):
+    # Schema is managed by migrations.py
+    uses_migrations = True
+
+    # Dimension value -> id caches, shared by every handler in the process
+    user_agent_ids = LRUCache(USER_AGENT_CACHE_SIZE)
+    path_ids = LRUCache(DIMENSION_CACHE_SIZE)
+    referrer_ids = LRUCache(DIMENSION_CACHE_SIZE)
+
+    def __init__(self, host, user, password, database, port, pool_size=1, ua_classifier=None, report_cache=None):
+        self.ua_classifier = ua_classifier or UserAgentClassifier()
+        self.report_cache = report_cache
+        self.pool_size = int(pool_size)
+        # LOAD DATA LOCAL is only allowed on bulk_load_log_entries' own connection
+        self._connect_args = dict(host=host, user=user, password=password, database=database, port=port)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._max_allowed_packet = None
+        self.ingest_run_id = None
+        self._reset_transaction()
         try:
-            self.conn = mysql.connector.connect(
-                host=host,
-                user=user,
-                password=password,
-                database=database,
-                port=port
-            )
+            # Ingestion and serial reports use this connection; concurrent reports use the pool
+            self.conn = mysql.connector.connect(**self._connect_args)
             self.cursor = self.conn.cursor(dictionary=True)
             logging.info("Connected to MySQL database.")
         except Error as e:
             logging.error(f"Database connection failed: {e}")
             raise
 
+    def clone(self, **connect_args):
+        """Returns a handler on a new connection to the same database, sharing caches and classifier.
+
+        connect_args are added to (or override) the connection arguments of
+        the new connection only.
+        """
+        clone = copy.copy(self)
+        clone.conn = mysql.connector.connect(**{**self._connect_args, **connect_args})
+        clone.cursor = clone.conn.cursor(dictionary=True)
+        clone._pool = None
+        clone._pool_lock = threading.Lock()
+        clone._reset_transaction()
+        return clone
+
+    def close_clone(self):
+        """Closes a clone's connection, leaving the shared classifier and cache open."""
+        if self.conn.is_connected():
+            self.cursor.close()
+            self.conn.close()
+
+    def _get_pool(self):
+        """Opens the report connection pool on first use, so ingest-only runs never pay for it."""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = MySQLConnectionPool(pool_name=f"log_analyzer_{id(self)}",
+                                                 pool_size=self.pool_size, **self._connect_args)
+                logging.info(f"Opened a pool of {self.pool_size} MySQL connections.")
+            return self._pool
+
+    def _reconnect(self, conn):
+        """Re-establishes a dropped connection in place; raises if the server stays unreachable."""
+        logging.warning("Lost MySQL connection; reconnecting.")
+        conn.reconnect(attempts=RECONNECT_ATTEMPTS, delay=RECONNECT_DELAY)
+
+    def pooled_report(self, name, args=()):
+        """Runs one report method on a connection borrowed from the pool and returns its rows.
+
+        The handler is shallow-copied so the report's SQL runs on the borrowed
+        connection; streamed reports are read to the end before it is returned.
+        Safe to call from several threads at once, up to pool_size.
+        """
+        conn = self._get_pool().get_connection()
+        try:
+            conn.ping(reconnect=True, attempts=RECONNECT_ATTEMPTS, delay=RECONNECT_DELAY)
+            for attempt in range(2):
+                worker = copy.copy(self)
+                worker.conn = conn
+                worker.cursor = conn.cursor(dictionary=True)
+                try:
+                    return list(getattr(worker, name)(*args))
+                except (InterfaceError, OperationalError):
+                    if attempt or conn.is_connected():
+                        raise
+                    self._reconnect(conn)
+                finally:
+                    worker.cursor.close()
+        finally:
+            conn.close()
+
+    def run_reports(self, reports, concurrent=True):
+        """Runs several report methods and returns {label: rows}.
+
+        reports maps a label to (method name, args). With concurrent, up to
+        pool_size reports run at once, each on its own pooled connection;
+        otherwise they run one after another on the main connection.
+        """
+        started = time.perf_counter()
+        if concurrent and self.pool_size > 1:
+            with ThreadPoolExecutor(max_workers=self.pool_size) as executor:
+                futures = {label: executor.submit(self.pooled_report, name, args)
+                           for label, (name, args) in reports.items()}
+                results = {label: future.result() for label, future in futures.items()}
+        else:
+            if not self.conn.is_connected():
+                self._reconnect(self.conn)
+                self.cursor = self.conn.cursor(dictionary=True)
+            results = {label: list(getattr(self, name)(*args)) for label, (name, args) in reports.items()}
+
+        elapsed = time.perf_counter() - started
+        mode = f"concurrently on {self.pool_size} connections" if concurrent and self.pool_size > 1 else "serially"
+        logging.info(f"Ran {len(reports)} reports {mode} in {elapsed:.3f}s")
+        return results
+
     def create_tables(self):
         """Creates user_agents and log_entries tables if they don't exist."""
         try:
@@ -40,6 +278,22 @@ class MySQLHandler:
                 )
             """)
 
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS paths (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    path_hash BINARY(16) NOT NULL UNIQUE,
+                    path TEXT
+                )
+            """)
+
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS referrers (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    referrer_hash BINARY(16) NOT NULL UNIQUE,
+                    referrer TEXT
+                )
+            """)
+
             self.cursor.execute("""
                 CREATE TABLE IF NOT EXISTS log_entries (
                     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -55,85 +309,696 @@ class MySQLHandler:
                     FOREIGN KEY (user_agent_id) REFERENCES user_agents(id)
                 )
             """)
+
+            # Per-hour request counts maintained at ingest time for the reports
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS rollup_status (
+                    hour_bucket DATETIME,
+                    status_code INT,
+                    request_count BIGINT UNSIGNED NOT NULL,
+                    PRIMARY KEY (hour_bucket, status_code)
+                )
+            """)
+
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS rollup_path (
+                    hour_bucket DATETIME,
+                    path_hash BINARY(16),
+                    path TEXT,
+                    request_count BIGINT UNSIGNED NOT NULL,
+                    PRIMARY KEY (hour_bucket, path_hash)
+                )
+            """)
+
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS rollup_ip (
+                    hour_bucket DATETIME,
+                    ip_address VARCHAR(45),
+                    request_count BIGINT UNSIGNED NOT NULL,
+                    PRIMARY KEY (hour_bucket, ip_address)
+                )
+            """)
+
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS rollup_user_agent (
+                    hour_bucket DATETIME,
+                    user_agent_id INT,
+                    request_count BIGINT UNSIGNED NOT NULL,
+                    PRIMARY KEY (hour_bucket, user_agent_id)
+                )
+            """)
+
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+                    file_path VARCHAR(512) PRIMARY KEY,
+                    inode BIGINT UNSIGNED,
+                    byte_offset BIGINT UNSIGNED,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+                )
+            """)
+
+            # One row per process_logs run; the manifest lists the byte ranges each run committed
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_runs (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    status VARCHAR(16) NOT NULL,
+                    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    finished_at TIMESTAMP NULL
+                )
+            """)
+
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_manifest (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    run_id INT,
+                    fingerprint BINARY(20) NOT NULL,
+                    file_path VARCHAR(512),
+                    start_offset BIGINT UNSIGNED NOT NULL,
+                    end_offset BIGINT UNSIGNED NOT NULL,
+                    row_count INT UNSIGNED NOT NULL,
+                    new_rows INT UNSIGNED NOT NULL,
+                    checksum BIGINT UNSIGNED NOT NULL,
+                    committed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    INDEX idx_fingerprint (fingerprint, start_offset),
+                    INDEX idx_run (run_id)
+                )
+            """)
+
+            # Alerts from the streaming anomaly detector (process_logs/follow_logs --detect_anomalies)
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS anomalies (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    detected_at DATETIME NOT NULL,
+                    minute DATETIME NOT NULL,
+                    kind VARCHAR(32) NOT NULL,
+                    subject VARCHAR(2048),
+                    value DOUBLE NOT NULL,
+                    baseline DOUBLE NULL,
+                    requests INT UNSIGNED NOT NULL,
+                    INDEX idx_minute (minute),
+                    INDEX idx_kind_minute (kind, minute)
+                )
+            """)
+
+            # Bumped after every ingest commit; cached reports are only valid for the generation they saw
+            self.cursor.execute("""
+                CREATE TABLE IF NOT EXISTS ingest_generation (
+                    id TINYINT PRIMARY KEY,
+                    generation BIGINT UNSIGNED NOT NULL
+                )
+            """)
             self.conn.commit()
             logging.info("Tables ensured.")
         except Error as e:
             logging.error(f"Error creating tables: {e}")
             raise
 
-    def _get_or_insert_user_agent(self, user_agent_str):
-        """Returns user_agent ID; inserts if new with parsed OS, browser, device."""
-        if not user_agent_str:
-            return None
-
+    def load_user_agent_cache(self):
+        """Preloads the shared user agent cache with the most recent user_agents rows."""
         try:
             self.cursor.execute(
-                "SELECT id FROM user_agents WHERE user_agent_string = %s",
-                (user_agent_str,)
+                "SELECT id, user_agent_string FROM user_agents ORDER BY id DESC LIMIT %s",
+                (self.user_agent_ids.max_size,)
             )
-            result = self.cursor.fetchone()
-            if result:
-                return result['id']
+            rows = self.cursor.fetchall()
+            # Oldest first, so the newest rows end up most recently used
+            for row in reversed(rows):
+                self.user_agent_ids.put(row['user_agent_string'], row['id'])
+            logging.info(f"Preloaded {len(rows)} user agents into cache.")
+        except Error as e:
+            logging.error(f"Failed to preload user agents: {e}")
+
+    @property
+    def max_allowed_packet(self):
+        """The server's max_allowed_packet in bytes, read once per handler."""
+        if self._max_allowed_packet is None:
+            self.cursor.execute("SELECT @@max_allowed_packet AS max_allowed_packet")
+            self._max_allowed_packet = int(self.cursor.fetchone()['max_allowed_packet'])
+        return self._max_allowed_packet
+
+    def _packet_chunks(self, items, item_bytes):
+        """Splits items into lists whose estimated SQL size (item_bytes per item) fits in one packet."""
+        limit = self.max_allowed_packet * PACKET_FILL
+        chunk, size = [], 0
+        for item in items:
+            length = item_bytes(item)
+            if chunk and size + length > limit:
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(item)
+            size += length
+        if chunk:
+            yield chunk
+
+    def max_insert_rows(self):
+        """Rows of log_entries that fit in one multi-row INSERT under max_allowed_packet."""
+        return max(1, int(self.max_allowed_packet * PACKET_FILL) // LOG_ENTRY_ROW_BYTES)
+
+    def _insert_entry_rows(self, rows):
+        """Inserts log_entries rows with multi-row INSERT statements that fit in max_allowed_packet.
+
+        A row whose row_hash is already stored is left as it is; returns the
+        number of rows actually inserted.
+        """
+        per_statement = self.max_insert_rows()
+        row_placeholders = '(%s, %s, %s, %s, %s, %s, %s, %s, %s)'
+        inserted = 0
+        for i in range(0, len(rows), per_statement):
+            chunk = rows[i:i + per_statement]
+            self.cursor.execute(
+                f"INSERT INTO log_entries ({LOG_ENTRY_COLUMNS}) VALUES {', '.join([row_placeholders] * len(chunk))} "
+                f"ON DUPLICATE KEY UPDATE row_hash = row_hash",
+                [value for row in chunk for value in row]
+            )
+            inserted += self.cursor.rowcount
+            METRICS.inc('mysql_statements_total', step='log_entries')
+        return inserted
+
+    def _stored_row_hashes(self, hashes):
+        """Returns the subset of hashes already in log_entries, with one SELECT per packet-sized chunk."""
+        stored = set()
+        for chunk in self._packet_chunks(hashes, lambda row_hash: 22):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            self.cursor.execute(f"SELECT row_hash FROM log_entries WHERE row_hash IN ({placeholders})", chunk)
+            stored.update(row['row_hash'] for row in self.cursor.fetchall())
+        return stored
+
+    def _resolve_user_agents(self, user_agent_strings):
+        """Returns {user_agent_string: id}, upserting any not in the cache with multi-row INSERTs and SELECTs."""
+        ids, missing = {}, []
+
+        pending = self._pending_ids['user_agent']
+        for ua in set(user_agent_strings):
+            user_agent_id = (self.user_agent_ids.get(ua) or pending.get(ua)) if ua else None
+            if ua and user_agent_id is None:
+                missing.append(ua)
             else:
-                parsed_ua = parse_ua(user_agent_str)
-                os = parsed_ua.os.family
-                browser = parsed_ua.browser.family
-                device_type = "Mobile" if parsed_ua.is_mobile else \
-                              "Tablet" if parsed_ua.is_tablet else \
-                              "PC" if parsed_ua.is_pc else \
-                              "Bot" if parsed_ua.is_bot else "Other"
+                ids[ua] = user_agent_id
+        METRICS.inc('dimension_cache_total', len(ids), dimension='user_agent', result='hit')
+        METRICS.inc('dimension_cache_total', len(missing), dimension='user_agent', result='miss')
 
-                self.cursor.execute("""
+        if missing:
+            missing.sort()  # same lock order in every writer
+            classified = self.ua_classifier.classify_many(missing)
+            rows = [(ua, *classified[ua]) for ua in missing]
+            for chunk in self._packet_chunks(rows, lambda row: 2 * len(row[0]) + 128):
+                placeholders = ', '.join(['(%s, %s, %s, %s)'] * len(chunk))
+                self.cursor.execute(f"""
                     INSERT INTO user_agents (user_agent_string, os, browser, device_type)
-                    VALUES (%s, %s, %s, %s)
-                """, (user_agent_str, os, browser, device_type))
-                self.conn.commit()
-                return self.cursor.lastrowid
+                    VALUES {placeholders}
+                    ON DUPLICATE KEY UPDATE id = id
+                """, [value for row in chunk for value in row])
+                METRICS.inc('mysql_statements_total', step='user_agents')
+
+            for chunk in self._packet_chunks(missing, lambda ua: 2 * len(ua) + 8):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                # A locking read sees rows other writers committed after this transaction's snapshot
+                self.cursor.execute(
+                    f"SELECT id, user_agent_string FROM user_agents WHERE user_agent_string IN ({placeholders}) "
+                    f"LOCK IN SHARE MODE",
+                    chunk
+                )
+                METRICS.inc('mysql_statements_total', step='user_agents')
+                for row in self.cursor.fetchall():
+                    pending[row['user_agent_string']] = row['id']
+                    ids[row['user_agent_string']] = row['id']
+            _warn_unresolved('user_agents', len(missing), sum(1 for ua in missing if ua in pending))
+
+        return ids
+
+    def _resolve_dimension(self, table, column, cache, values):
+        """Returns {value: id} for a hashed dimension table (paths, referrers), upserting unseen values."""
+        ids, missing = {}, []
+
+        pending = self._pending_ids[column]
+        for value in set(values):
+            dimension_id = (cache.get(value) or pending.get(value)) if value is not None else None
+            if value is not None and dimension_id is None:
+                missing.append(value)
+            else:
+                ids[value] = dimension_id
+        METRICS.inc('dimension_cache_total', len(ids), dimension=column, result='hit')
+        METRICS.inc('dimension_cache_total', len(missing), dimension=column, result='miss')
+
+        if missing:
+            by_hash = dict(sorted((_md5(value), value) for value in missing))
+            for chunk in self._packet_chunks(list(by_hash.items()), lambda pair: 2 * len(pair[1]) + 48):
+                placeholders = ', '.join(['(%s, %s)'] * len(chunk))
+                self.cursor.execute(f"""
+                    INSERT INTO {table} ({column}_hash, {column})
+                    VALUES {placeholders}
+                    ON DUPLICATE KEY UPDATE id = id
+                """, [item for pair in chunk for item in pair])
+                METRICS.inc('mysql_statements_total', step=table)
+
+            for chunk in self._packet_chunks(list(by_hash), lambda value_hash: 40):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                self.cursor.execute(
+                    f"SELECT id, {column}_hash FROM {table} WHERE {column}_hash IN ({placeholders}) "
+                    f"LOCK IN SHARE MODE",
+                    chunk
+                )
+                METRICS.inc('mysql_statements_total', step=table)
+                for row in self.cursor.fetchall():
+                    value = by_hash[bytes(row[f'{column}_hash'])]
+                    pending[value] = row['id']
+                    ids[value] = row['id']
+            _warn_unresolved(table, len(missing), sum(1 for value in missing if value in pending))
+
+        return ids
+
+    def _dimension_ids(self, records):
+        """Returns the (user_agent, path, referrer) {value: id} maps for records."""
+        with METRICS.timer('mysql_insert_step_seconds', step='user_agents'):
+            user_agent_ids = self._resolve_user_agents(record.user_agent for record in records)
+        with METRICS.timer('mysql_insert_step_seconds', step='dimensions'):
+            path_ids = self._resolve_dimension('paths', 'path', self.path_ids, (record.path for record in records))
+            referrer_ids = self._resolve_dimension('referrers', 'referrer', self.referrer_ids,
+                                                   (record.referrer for record in records))
+        return user_agent_ids, path_ids, referrer_ids
+
+    def resolve_dimensions(self, batches):
+        """Resolves the dimension IDs of all batches of a transaction before any of them is inserted.
+
+        Each dimension table is then upserted once, in sorted order, so
+        concurrent writers lock dimension rows in the same order across the
+        whole transaction; the batches' own lookups find the pending IDs.
+        On failure the transaction is rolled back and the error re-raised.
+        """
+        try:
+            self._dimension_ids([record for batch in batches for record in batch])
+        except Error:
+            self._rollback()
+            raise
+
+    def _entry_rows(self, records, hashes=None):
+        """Converts LogRecords into log_entries rows, resolving dimension IDs and packing IPs.
+
+        hashes are the rows' row_hash values, NULL if not given.
+        """
+        user_agent_ids, path_ids, referrer_ids = self._dimension_ids(records)
+
+        return [
+            (
+                _pack_ip(ip_address),
+                timestamp,
+                method,
+                path_ids.get(path),
+                status_code,
+                bytes_sent,
+                referrer_ids.get(referrer),
+                user_agent_ids.get(user_agent),
+                row_hash
+            )
+            for (ip_address, timestamp, method, path, status_code, bytes_sent, referrer, user_agent), row_hash
+            in zip(records, hashes or [None] * len(records))
+        ]
+
+    def _reset_transaction(self):
+        """Forgets the dimension IDs and rollup counts of the open transaction.
+
+        IDs this connection inserted are not visible to other writers until
+        it commits, and vanish if it rolls back, so they are only put in the
+        shared caches by _commit(). Rollup counts are applied by _commit() in
+        one sorted pass, so every writer locks rollup rows in the same order
+        and holds them only while committing.
+        """
+        self._pending_ids = {'user_agent': {}, 'path': {}, 'referrer': {}}
+        self._pending_rollups = _rollup_counts([], [])
+
+    def _rollback(self):
+        self.conn.rollback()
+        self._reset_transaction()
+
+    def _commit(self):
+        """Applies the transaction's rollups and commits; then shares its dimension IDs and bumps the generation."""
+        with METRICS.timer('mysql_insert_step_seconds', step='rollups'):
+            self._update_rollups(self._pending_rollups)
+        with METRICS.timer('mysql_insert_step_seconds', step='commit'):
+            self.conn.commit()
+        for name, cache in (('user_agent', self.user_agent_ids), ('path', self.path_ids),
+                            ('referrer', self.referrer_ids)):
+            for value, dimension_id in self._pending_ids[name].items():
+                cache.put(value, dimension_id)
+        self._reset_transaction()
+
+        # A transaction of its own, so writers do not queue on the single generation row
+        try:
+            self._bump_generation()
+            self.conn.commit()
         except Error as e:
-            logging.error(f"User agent insertion failed: {e}")
-            return None
+            self.conn.rollback()
+            logging.warning(f"Could not advance the ingest generation; cached reports may lag: {e}")
 
-    def insert_batch_log_entries(self, log_data_list):
-        """Insert a batch of parsed log entries."""
+    def _upsert_rollup(self, table, columns, rows):
+        """Adds request counts to a rollup table; rows end with the count."""
+        placeholders = '(' + ', '.join(['%s'] * (len(columns) + 1)) + ')'
+        for i in range(0, len(rows), ROLLUP_UPSERT_ROWS):
+            chunk = rows[i:i + ROLLUP_UPSERT_ROWS]
+            self.cursor.execute(f"""
+                INSERT INTO {table} ({', '.join(columns)}, request_count)
+                VALUES {', '.join([placeholders] * len(chunk))}
+                ON DUPLICATE KEY UPDATE request_count = request_count + VALUES(request_count)
+            """, [value for row in chunk for value in row])
+
+    def _update_rollups(self, counts):
+        """Applies _rollup_counts() output in the current transaction.
+
+        _commit() passes the whole transaction's counts at once, and rows are
+        upserted in primary key order, so concurrent writers lock rollup rows
+        in the same order (however many batches each commits together) and
+        do not deadlock each other.
+        """
+        self._upsert_rollup('rollup_status', ('hour_bucket', 'status_code'),
+                            [(*key, count) for key, count in sorted(counts['status'].items())])
+        self._upsert_rollup('rollup_path', ('hour_bucket', 'path_hash', 'path'),
+                            sorted((hour_bucket, hashlib.md5(path.encode('utf-8')).digest(), path, count)
+                                   for (hour_bucket, path), count in counts['path'].items()))
+        self._upsert_rollup('rollup_ip', ('hour_bucket', 'ip_address'),
+                            sorted((hour_bucket, str(ipaddress.ip_address(ip_packed)), count)
+                                   for (hour_bucket, ip_packed), count in counts['ip'].items()))
+        self._upsert_rollup('rollup_user_agent', ('hour_bucket', 'user_agent_id'),
+                            [(*key, count) for key, count in sorted(counts['user_agent'].items())])
+
+    def rebuild_rollups(self):
+        """Recomputes every rollup table from log_entries in one transaction."""
         try:
-            entries_to_insert = []
-            user_agent_cache = {}
-
-            for entry in log_data_list:
-                ua = entry['user_agent']
-                if ua not in user_agent_cache:
-                    user_agent_cache[ua] = self._get_or_insert_user_agent(ua)
-                user_agent_id = user_agent_cache[ua]
-
-                entries_to_insert.append((
-                    entry['ip_address'],
-                    entry["timestamp"].strftime('%Y-%m-%d %H:%M:%S'),
-                    entry['method'],
-                    entry['path'],
-                    entry['status_code'],
-                    entry['bytes_sent'],
-                    entry['referrer'],
-                    user_agent_id
-                ))
-
-            insert_query = """
-                INSERT INTO log_entries (
-                    ip_address, timestamp, method, path, status_code,
-                    bytes_sent, referrer, user_agent_id
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """
-
-            self.cursor.executemany(insert_query, entries_to_insert)
+            for table in ('rollup_status', 'rollup_path', 'rollup_ip', 'rollup_user_agent'):
+                self.cursor.execute(f"DELETE FROM {table}")
+
+            hour_bucket = "DATE_FORMAT(timestamp, '%Y-%m-%d %H:00:00')"
+            self.cursor.execute(f"""
+                INSERT INTO rollup_status (hour_bucket, status_code, request_count)
+                SELECT {hour_bucket} AS hb, status_code, COUNT(*)
+                FROM log_entries
+                GROUP BY hb, status_code
+            """)
+            self.cursor.execute(f"""
+                INSERT INTO rollup_path (hour_bucket, path_hash, path, request_count)
+                SELECT {hour_bucket} AS hb, p.path_hash, MIN(p.path), COUNT(*)
+                FROM log_entries le
+                JOIN paths p ON p.id = le.path_id
+                GROUP BY hb, p.path_hash
+            """)
+            self.cursor.execute(f"""
+                INSERT INTO rollup_ip (hour_bucket, ip_address, request_count)
+                SELECT {hour_bucket} AS hb, INET6_NTOA(ip_address) AS ip, COUNT(*)
+                FROM log_entries
+                WHERE ip_address IS NOT NULL
+                GROUP BY hb, ip
+            """)
+            self.cursor.execute(f"""
+                INSERT INTO rollup_user_agent (hour_bucket, user_agent_id, request_count)
+                SELECT {hour_bucket} AS hb, user_agent_id, COUNT(*)
+                FROM log_entries
+                WHERE user_agent_id IS NOT NULL
+                GROUP BY hb, user_agent_id
+            """)
+            self._bump_generation()
             self.conn.commit()
+            logging.info("Rollup tables rebuilt.")
+        except Error as e:
+            logging.error(f"Failed to rebuild rollups: {e}")
+            self.conn.rollback()
+            raise
+
+    def _bump_generation(self):
+        """Advances the ingest generation; _commit() runs it in a short transaction after each ingest commit."""
+        self.cursor.execute("""
+            INSERT INTO ingest_generation (id, generation) VALUES (1, 1)
+            ON DUPLICATE KEY UPDATE generation = generation + 1
+        """)
+
+    def get_generation(self):
+        """Returns the latest committed ingest generation (0 before the first ingest)."""
+        # End any open read snapshot so the value is current, not as of the first read
+        self.conn.commit()
+        self.cursor.execute("SELECT generation FROM ingest_generation WHERE id = 1")
+        row = self.cursor.fetchone()
+        return row['generation'] if row else 0
+
+    def get_checkpoint(self, file_path):
+        """Returns the committed (inode, byte_offset) for a followed file, or None."""
+        self.cursor.execute(
+            "SELECT inode, byte_offset FROM ingest_checkpoints WHERE file_path = %s",
+            (file_path,)
+        )
+        row = self.cursor.fetchone()
+        return (row['inode'], row['byte_offset']) if row else None
+
+    def start_ingest_run(self):
+        """Records a new ingest run; batches inserted by this handler and its clones are listed under it."""
+        self.cursor.execute("INSERT INTO ingest_runs (status) VALUES ('running')")
+        self.conn.commit()
+        self.ingest_run_id = self.cursor.lastrowid
+        return self.ingest_run_id
+
+    def finish_ingest_run(self, status):
+        """Marks the current run completed or failed; returns its (rows, new_rows) from the manifest."""
+        self.cursor.execute(
+            "UPDATE ingest_runs SET status = %s, finished_at = CURRENT_TIMESTAMP WHERE id = %s",
+            (status, self.ingest_run_id)
+        )
+        self.conn.commit()
+        self.cursor.execute("""
+            SELECT CAST(COALESCE(SUM(row_count), 0) AS UNSIGNED) AS row_count,
+                   CAST(COALESCE(SUM(new_rows), 0) AS UNSIGNED) AS new_rows
+            FROM ingest_manifest WHERE run_id = %s
+        """, (self.ingest_run_id,))
+        row = self.cursor.fetchone()
+        self.ingest_run_id = None
+        return row['row_count'], row['new_rows']
+
+    def record_anomalies(self, alerts):
+        """Inserts AnomalyDetector alerts into the anomalies table in one statement and commits."""
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(alerts))
+        self.cursor.execute(f"""
+            INSERT INTO anomalies (detected_at, minute, kind, subject, value, baseline, requests)
+            VALUES {placeholders}
+        """, [alert[column] for alert in alerts
+              for column in ('detected_at', 'minute', 'kind', 'subject', 'value', 'baseline', 'requests')])
+        self.conn.commit()
+
+    def committed_ranges(self, fingerprint):
+        """Returns the (start_offset, end_offset) byte ranges committed for a file in any run."""
+        self.cursor.execute(
+            "SELECT start_offset, end_offset FROM ingest_manifest WHERE fingerprint = %s",
+            (fingerprint,)
+        )
+        return [(row['start_offset'], row['end_offset']) for row in self.cursor.fetchall()]
+
+    def _manifest_row(self, batch, hashes, new_rows):
+        return (self.ingest_run_id, batch.source.fingerprint, batch.source.path, batch.start, batch.end,
+                len(batch), new_rows, batch_checksum(hashes))
+
+    def _record_manifest(self, rows):
+        """Adds _manifest_row() tuples to ingest_manifest in the current transaction."""
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s)'] * len(rows))
+        self.cursor.execute(f"""
+            INSERT INTO ingest_manifest (run_id, fingerprint, file_path, start_offset, end_offset,
+                                         row_count, new_rows, checksum)
+            VALUES {placeholders}
+        """, [value for row in rows for value in row])
+
+    def insert_batch_log_entries(self, log_data_list, checkpoint=None, raise_errors=False, commit=True):
+        """Insert a batch of LogRecords; returns True once committed.
+
+        A (file_path, inode, byte_offset) checkpoint is saved in the same
+        transaction, so the offset only moves forward with the rows it covers.
+        For a SourceBatch each row gets a row_hash, rows already stored are
+        skipped (and left out of the rollups) and the batch's byte range is
+        added to ingest_manifest, all in the same transaction.
+        With commit=False the transaction is left open for commit(), so
+        several batches can share one. On failure the whole transaction is
+        rolled back and False is returned, or with raise_errors the error is
+        re-raised.
+        """
+        try:
+            source = getattr(log_data_list, 'source', None)
+            with METRICS.timer('mysql_insert_step_seconds', step='row_hashes'):
+                hashes = row_hashes(log_data_list) if source is not None else None
+            records = log_data_list
+            entries_to_insert = self._entry_rows(records, hashes)
+
+            timer = METRICS.timer('mysql_insert_step_seconds', step='log_entries')
+            if hashes is None:
+                with timer:
+                    self._insert_entry_rows(entries_to_insert)
+            else:
+                self.cursor.execute("SAVEPOINT batch_entries")
+                with timer:
+                    inserted = self._insert_entry_rows(entries_to_insert)
+                if inserted < len(entries_to_insert):
+                    # Part of the batch was loaded before: insert only the new rows, so
+                    # the rollups count every row once. Only re-runs take this path.
+                    self.cursor.execute("ROLLBACK TO SAVEPOINT batch_entries")
+                    seen = self._stored_row_hashes(hashes)
+                    keep = []
+                    for i, row_hash in enumerate(hashes):
+                        if row_hash not in seen:
+                            seen.add(row_hash)
+                            keep.append(i)
+                    records = [log_data_list[i] for i in keep]
+                    entries_to_insert = [entries_to_insert[i] for i in keep]
+                    self._insert_entry_rows(entries_to_insert)
+                    METRICS.inc('mysql_duplicate_rows_total', len(log_data_list) - len(entries_to_insert))
+                self._record_manifest([self._manifest_row(log_data_list, hashes, len(entries_to_insert))])
+
+            for name, counter in _rollup_counts(records, entries_to_insert).items():
+                self._pending_rollups[name].update(counter)
+            if checkpoint:
+                self.cursor.execute("""
+                    INSERT INTO ingest_checkpoints (file_path, inode, byte_offset)
+                    VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE inode = VALUES(inode), byte_offset = VALUES(byte_offset)
+                """, checkpoint)
+            if commit:
+                self._commit()
+            METRICS.inc('mysql_rows_inserted_total', len(entries_to_insert))
             logging.info(f"Inserted {len(entries_to_insert)} log entries.")
+            return True
         except Error as e:
+            METRICS.inc('mysql_batch_errors_total')
             logging.error(f"Batch insert failed: {e}")
+            self._rollback()
+            if raise_errors:
+                raise
+            return False
+
+    def commit(self):
+        """Commits batches inserted with commit=False, rolling them all back if the commit fails."""
+        try:
+            self._commit()
+        except Error:
+            self._rollback()
+            raise
 
+    def _load_tsv(self, tsv_path, expected_rows, rollup_counts, manifest_rows):
+        """Loads one TSV file into log_entries with its rollups and manifest rows and checks the loaded row count.
+
+        LOAD DATA LOCAL skips rows whose row_hash is already stored, so a
+        shortfall also means the load overlaps an earlier one; the rollups
+        cannot tell which rows those were, so it raises and the caller rolls
+        the whole file back, as it does for any other failure before the commit.
+        """
+        load_started = time.perf_counter()
+        self.cursor.execute("""
+            LOAD DATA LOCAL INFILE %s
+            INTO TABLE log_entries
+            FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+            LINES TERMINATED BY '\\n'
+            (@ip_address, timestamp, method, path_id, status_code,
+             bytes_sent, referrer_id, user_agent_id, row_hash)
+            SET ip_address = INET6_ATON(@ip_address)
+        """, (tsv_path,))
+        loaded = self.cursor.rowcount
+        METRICS.observe('mysql_insert_step_seconds', time.perf_counter() - load_started, step='load_data')
+
+        if loaded != expected_rows:
+            raise Error(f"Bulk load row count mismatch: wrote {expected_rows}, loaded {loaded}; if these "
+                        f"logs were loaded before, use --resume or the batched insert path")
+        self._pending_rollups = rollup_counts
+        if manifest_rows:
+            self._record_manifest(manifest_rows)
+        self._commit()
+        METRICS.inc('mysql_rows_inserted_total', loaded)
+        logging.info(f"Bulk loaded {loaded} log entries.")
+        return loaded
+
+    def bulk_load_log_entries(self, batches, defer_checks=False):
+        """Loads batches of parsed entries through temporary TSV files and LOAD DATA LOCAL INFILE.
+
+        The load runs on a connection of its own, the only one allowed to send
+        local files, and only from a private temporary directory holding the
+        TSV files. See _bulk_load() for defer_checks and failures. Returns the
+        number of rows loaded.
+        """
+        tsv_dir = tempfile.mkdtemp(prefix='log_entries_')
+        try:
+            # allow_local_infile=True would allow any path; with False only tsv_dir is allowed
+            loader = self.clone(allow_local_infile=False, allow_local_infile_in_path=tsv_dir)
+            try:
+                return loader._bulk_load(batches, defer_checks, tsv_dir)
+            finally:
+                loader.close_clone()
+        finally:
+            os.rmdir(tsv_dir)
+
+    def _bulk_load(self, batches, defer_checks, tsv_dir):
+        """Loads batches through TSV files written to tsv_dir.
+
+        With defer_checks, foreign key and unique checks (and non-unique index
+        maintenance on engines that support DISABLE KEYS) are switched off for
+        the duration of the load, so rows already loaded may not be detected
+        by their row_hash; use it for first loads. Returns the number of rows
+        loaded.
+
+        If anything fails, the open transaction is rolled back before the
+        checks are switched back on, since ALTER TABLE ... ENABLE KEYS commits
+        implicitly and would otherwise commit log_entries rows without their
+        rollups and manifest rows.
+        """
+        total = 0
+
+        if defer_checks:
+            self.cursor.execute("SET foreign_key_checks = 0")
+            self.cursor.execute("SET unique_checks = 0")
+            self.cursor.execute("ALTER TABLE log_entries DISABLE KEYS")
+
+        try:
+            batches = iter(batches)
+            exhausted = False
+            while not exhausted:
+                fd, tsv_path = tempfile.mkstemp(prefix='log_entries_', suffix='.tsv', dir=tsv_dir)
+                try:
+                    rows = 0
+                    rollup_counts = _rollup_counts([], [])
+                    manifest_rows = []
+                    with os.fdopen(fd, 'w', encoding='utf-8', newline='\n') as tsv:
+                        while rows < BULK_LOAD_ROWS:
+                            batch = next(batches, None)
+                            if batch is None:
+                                exhausted = True
+                                break
+                            hashes = None
+                            if getattr(batch, 'source', None) is not None:
+                                hashes = row_hashes(batch)
+                                manifest_rows.append(self._manifest_row(batch, hashes, len(batch)))
+                            entry_rows = self._entry_rows(batch, hashes)
+                            # The IP is written as text and packed by INET6_ATON during the load
+                            for record, row in zip(batch, entry_rows):
+                                fields = (record.ip_address,) + row[1:]
+                                tsv.write('\t'.join(map(_tsv_field, fields)) + '\n')
+                            for name, counter in _rollup_counts(batch, entry_rows).items():
+                                rollup_counts[name].update(counter)
+                            rows += len(batch)
+                    if rows:
+                        total += self._load_tsv(tsv_path, rows, rollup_counts, manifest_rows)
+                finally:
+                    os.remove(tsv_path)
+        except BaseException:
+            self._rollback()
+            if defer_checks:
+                self._restore_checks()
+            raise
+
+        if defer_checks:
+            self._restore_checks()
+        return total
+
+    def _restore_checks(self):
+        """Undoes bulk_load_log_entries' defer_checks; ENABLE KEYS commits implicitly."""
+        self.cursor.execute("ALTER TABLE log_entries ENABLE KEYS")
+        self.cursor.execute("SET unique_checks = 1")
+        self.cursor.execute("SET foreign_key_checks = 1")
+
+    @timed_report
+    @_cached_report
     def get_top_n_ips(self, n):
         try:
             self.cursor.execute("""
-                SELECT ip_address, COUNT(*) AS request_count
-                FROM log_entries
+                SELECT ip_address, CAST(SUM(request_count) AS UNSIGNED) AS request_count
+                FROM rollup_ip
                 GROUP BY ip_address
                 ORDER BY request_count DESC
                 LIMIT %s
@@ -143,57 +1008,71 @@ class MySQLHandler:
             logging.error(f"Failed to fetch top IPs: {e}")
             return []
 
+    @timed_report
+    @_cached_report
     def get_top_n_requested_urls(self, n):
         query = """
-            SELECT path, COUNT(*) AS request_count
-            FROM log_entries
-            GROUP BY path
+            SELECT MIN(path) AS path, CAST(SUM(request_count) AS UNSIGNED) AS request_count
+            FROM rollup_path
+            GROUP BY path_hash
             ORDER BY request_count DESC
             LIMIT %s;
         """
         self.cursor.execute(query, (n,))
         return self.cursor.fetchall()
 
+    @timed_report
+    @_cached_report
     def get_os_distribution(self):
         query = """
-            SELECT os, COUNT(*) AS requests
+            SELECT os, CAST(SUM(r.request_count) AS UNSIGNED) AS requests
             FROM user_agents ua
-            JOIN log_entries le ON le.user_agent_id = ua.id
+            JOIN rollup_user_agent r ON r.user_agent_id = ua.id
             GROUP BY os
             ORDER BY requests DESC;
         """
         self.cursor.execute(query)
         return self.cursor.fetchall()
 
-    def get_error_logs(self, status_code):
+    @timed_report
+    @_cached_report
+    def get_method_distribution(self):
         query = """
-            SELECT ip_address, path, status_code, timestamp
+            SELECT method, COUNT(*) AS request_count
             FROM log_entries
-            WHERE status_code = %s
-            ORDER BY timestamp DESC
-            LIMIT 100;
+            GROUP BY method
+            ORDER BY request_count DESC;
         """
-        self.cursor.execute(query, (status_code,))
+        self.cursor.execute(query)
+        return self.cursor.fetchall()
+
+    @timed_report
+    def get_error_logs(self, status_code):
+        self.cursor.execute(ERROR_LOGS_QUERY, (status_code,))
         return self.cursor.fetchall()
 
+    @timed_report
+    @_cached_report
     def get_hourly_traffic(self):
         query = """
-            SELECT HOUR(timestamp) AS hour, COUNT(*) AS request_count
-            FROM log_entries
+            SELECT HOUR(hour_bucket) AS hour, CAST(SUM(request_count) AS UNSIGNED) AS request_count
+            FROM rollup_status
             GROUP BY hour
             ORDER BY hour;
         """
         self.cursor.execute(query)
         return self.cursor.fetchall()
 
+    @timed_report
+    @_cached_report
     def get_status_code_distribution(self):
         try:
-            self.cursor.execute("SELECT COUNT(*) as total FROM log_entries")
+            self.cursor.execute("SELECT SUM(request_count) as total FROM rollup_status")
             total = self.cursor.fetchone()['total']
 
             self.cursor.execute("""
-                SELECT status_code, COUNT(*) as count
-                FROM log_entries
+                SELECT status_code, CAST(SUM(request_count) AS UNSIGNED) as count
+                FROM rollup_status
                 GROUP BY status_code
                 ORDER BY count DESC
             """)
@@ -206,18 +1085,111 @@ class MySQLHandler:
             logging.error(f"Failed to fetch status distribution: {e}")
             return []
         
-    def get_error_logs_by_date(self, date_str):
-        query = """
-            SELECT ip_address, path, status_code, timestamp
-            FROM log_entries
-            WHERE DATE(timestamp) = %s AND status_code >= 400
-            ORDER BY timestamp DESC
+    @timed_report
+    def get_table_sizes(self):
+        """Approximate rows and on-disk MB for each table, from information_schema."""
+        self.cursor.execute("""
+            SELECT TABLE_NAME AS table_name, TABLE_ROWS AS approx_rows,
+                   ROUND(DATA_LENGTH / 1048576, 2) AS data_mb,
+                   ROUND(INDEX_LENGTH / 1048576, 2) AS index_mb
+            FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE()
+            ORDER BY DATA_LENGTH + INDEX_LENGTH DESC
+        """)
+        return self.cursor.fetchall()
+
+    @timed_report
+    def get_error_logs_by_date(self, date_str, page_size=REPORT_PAGE_SIZE):
+        """Yields error rows for a date, newest first, without holding the result set in memory.
+
+        Each keyset page is read from its own unbuffered cursor, so memory use
+        stays at one row regardless of how many errors the day has.
         """
-        self.cursor.execute(query, (date_str,))
+        try:
+            start, end = _day_range(date_str)
+        except ValueError:
+            logging.error(f"Invalid date (expected YYYY-MM-DD): {date_str}")
+            return
+
+        last = None
+        while True:
+            cursor = self.conn.cursor(dictionary=True, buffered=False)
+            try:
+                if last is None:
+                    cursor.execute(ERROR_LOGS_BY_DATE_QUERY.format(after=''), (start, end, page_size))
+                else:
+                    cursor.execute(ERROR_LOGS_BY_DATE_QUERY.format(after=ERROR_LOGS_BY_DATE_AFTER),
+                                   (start, end, last[0], last[0], last[1], page_size))
+                rows = 0
+                for row in cursor:
+                    rows += 1
+                    last = (row['timestamp'], row.pop('id'))
+                    yield row
+            finally:
+                # A consumer that stops early leaves the page unread, which
+                # would block every later statement on the connection
+                if self.conn.unread_result:
+                    self.conn.consume_results()
+                cursor.close()
+
+            if rows < page_size:
+                return
+
+    def explain(self, query, params=()):
+        """Returns the EXPLAIN rows for a query."""
+        self.cursor.execute("EXPLAIN " + query, params)
         return self.cursor.fetchall()
 
+    def explain_report_queries(self, status_code=404, date_str=None):
+        """Returns (report, table, partitions, key, rows, extra) from EXPLAIN for the log_entries report queries.
+
+        extra is EXPLAIN's Extra column, which says 'Using filesort' when the
+        query's ORDER BY is not read from an index.
+        """
+        date_str = date_str or datetime.now().strftime('%Y-%m-%d')
+        plans = {
+            'error_logs': self.explain(ERROR_LOGS_QUERY, (status_code,)),
+            'error_logs_by_date': self.explain(ERROR_LOGS_BY_DATE_QUERY.format(after=''),
+                                               (*_day_range(date_str), REPORT_PAGE_SIZE)),
+        }
+        return [
+            (report, row['table'], row.get('partitions'), row['key'], row['rows'], row.get('Extra'))
+            for report, rows in plans.items()
+            for row in rows
+        ]
+
+    def unpruned_date_queries(self, date_str=None):
+        """Returns (report, partitions) for each date-range query whose EXPLAIN reads partitions outside the day.
+
+        A query pruned to the day reads at most the day's partition, the next
+        day's (the half-open end is its first second), p_old (MySQL always
+        reads the first partition of a TO_DAYS range) and p_future. Both the
+        first and the later keyset pages of error_logs_by_date are checked.
+        An unpartitioned log_entries returns nothing.
+        """
+        date_str = date_str or datetime.now().strftime('%Y-%m-%d')
+        start, end = _day_range(date_str)
+        allowed = {'p_old', 'p_future', f"p{start:%Y%m%d}", f"p{end:%Y%m%d}"}
+        plans = {
+            'error_logs_by_date': self.explain(ERROR_LOGS_BY_DATE_QUERY.format(after=''),
+                                               (start, end, REPORT_PAGE_SIZE)),
+            'error_logs_by_date (keyset page)': self.explain(
+                ERROR_LOGS_BY_DATE_QUERY.format(after=ERROR_LOGS_BY_DATE_AFTER),
+                (start, end, end, end, 0, REPORT_PAGE_SIZE)
+            ),
+        }
+        unpruned = []
+        for report, rows in plans.items():
+            for row in rows:
+                partitions = row.get('partitions')
+                if row['table'] == 'le' and partitions and not set(partitions.split(',')) <= allowed:
+                    unpruned.append((report, partitions))
+        return unpruned
 
     def close(self):
+        self.ua_classifier.close()
+        if self.report_cache is not None:
+            self.report_cache.close()
         if self.conn.is_connected():
             self.cursor.close()
             self.conn.close()
@@ -0,0 +1,126 @@
+# parallel_ingest.py
+
+import os
+import time
+import logging
+from collections import deque
+from multiprocessing import Pool
+from log_parser import LogParser, record_parse_stats
+from log_sources import SourceBatch, split_lines
+from malformed_lines import MalformedLines
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Upper and lower bounds for a single byte range handed to a worker
+MAX_CHUNK_SIZE = 32 * 1024 * 1024
+MIN_CHUNK_SIZE = 64 * 1024
+
+# Parser instance owned by each worker process
+_worker_parser = None
+
+
+def _init_worker(keep_rejects=False):
+    global _worker_parser
+    _worker_parser = LogParser(MalformedLines(keep_rejects=keep_rejects))
+
+
+def split_byte_ranges(file_path, chunk_size, start=0):
+    """Splits a file from byte offset start into (start, end) byte ranges that end on a newline."""
+    file_size = os.path.getsize(file_path)
+    ranges = []
+
+    with open(file_path, 'rb') as f:
+        while start < file_size:
+            end = min(start + chunk_size, file_size)
+            if end < file_size:
+                # Move the boundary forward to the start of the next line
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            ranges.append((start, end))
+            start = end
+
+    return ranges
+
+
+def _parse_range(task):
+    """Parses one byte range in a worker.
+
+    Returns (pid, lines, seconds, entries, line offsets of the entries, parse
+    stats, MalformedLines.take() of the range).
+    """
+    file_path, start, end = task
+    started = time.perf_counter()
+
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    # Ranges end on b'\n', so decoding each one on its own gives the same text
+    # (and the same universal-newline split) as reading the whole file serially.
+    entries, offsets, lines = [], [], 0
+    for offset, line in split_lines(data, start):
+        lines += 1
+        parsed = _worker_parser.parse_line(line)
+        if parsed:
+            entries.append(parsed)
+            offsets.append(offset)
+
+    return (os.getpid(), lines, time.perf_counter() - started, entries, offsets,
+            _worker_parser.take_stats(), _worker_parser.malformed_lines.take())
+
+
+def iter_parsed_batches(file_path, batch_size, workers, start=0, malformed_lines=None):
+    """Yields SourceBatches in file order, batch_size at a time, parsing byte ranges in a process pool.
+
+    The workers' malformed line counts, samples and rejects are merged into
+    malformed_lines if given.
+    """
+    file_size = os.path.getsize(file_path)
+    chunk_size = max(MIN_CHUNK_SIZE, min(MAX_CHUNK_SIZE, (file_size - start) // (workers * 4) + 1))
+    tasks = iter([(file_path, range_start, range_end)
+                  for range_start, range_end in split_byte_ranges(file_path, chunk_size, start)])
+
+    worker_stats = {}
+    batch = SourceBatch(start=start)
+
+    keep_rejects = malformed_lines is not None and malformed_lines.keep_rejects
+    with Pool(processes=workers, initializer=_init_worker, initargs=(keep_rejects,)) as pool:
+        # Keep a bounded window of ranges in flight so parsing cannot run
+        # arbitrarily far ahead of the writer.
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_parse_range, (task,)))
+            if len(pending) >= workers * 2:
+                break
+
+        while pending:
+            pid, lines, elapsed, entries, offsets, parse_stats, malformed = pending.popleft().get()
+            record_parse_stats(parse_stats)
+            if malformed_lines is not None:
+                malformed_lines.merge(malformed)
+            next_task = next(tasks, None)
+            if next_task is not None:
+                pending.append(pool.apply_async(_parse_range, (next_task,)))
+
+            stats = worker_stats.setdefault(pid, [0, 0.0])
+            stats[0] += lines
+            stats[1] += elapsed
+
+            for entry, offset in zip(entries, offsets):
+                if len(batch) >= batch_size:
+                    # The batch covers everything up to this entry's line
+                    batch.end = offset
+                    yield batch
+                    batch = SourceBatch(start=offset)
+                batch.append(entry)
+                batch.offsets.append(offset)
+
+    batch.end = file_size
+    if batch:
+        yield batch
+
+    for pid, (lines, elapsed) in sorted(worker_stats.items()):
+        rate = lines / elapsed if elapsed else 0
+        logging.info(f"Worker {pid}: parsed {lines} lines in {elapsed:.2f}s ({rate:.0f} lines/sec)")
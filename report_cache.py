@@ -0,0 +1,164 @@
+# report_cache.py
+
+import json
+import time
+import logging
+import sqlite3
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Seconds a cached report is served even if nothing was ingested
+DEFAULT_TTL = 60
+
+# Cached reports kept before the least recently used are evicted
+DEFAULT_MAX_ENTRIES = 1000
+
+# Seconds between writes of lookups' hit/miss counts and last-used times to the cache file
+FLUSH_INTERVAL = 5
+
+
+def cache_key(report, params):
+    """Stable key for a report name and its parameters."""
+    return report + json.dumps(list(params), default=str)
+
+
+class ReportCache:
+    """Report results cached in a sqlite file shared by every process on the host.
+
+    Each entry records the ingest generation it was computed at. A lookup
+    only hits when the generation is unchanged and the entry is younger than
+    ttl seconds; the least recently used entries are evicted past max_entries.
+    Lookups only read the file, so concurrent readers never wait for
+    sqlite's write lock: their hit and miss counts and last-used times are
+    kept in memory and written with the next put(), by a lookup at most every
+    FLUSH_INTERVAL seconds, and by stats() and close(). Rows are returned as
+    JSON decodes them (lists, with dates as strings) on hits and misses alike.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._used = {}             # cache_key -> last hit time, not yet written
+        self._flushed = time.monotonic()
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        # WAL lets processes read the cache while another one writes to it
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS report_cache (
+                cache_key TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                payload TEXT NOT NULL
+            )
+        """)
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON report_cache (last_used)")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+        self._db.execute("INSERT OR IGNORE INTO cache_stats VALUES ('hits', 0), ('misses', 0)")
+        self._db.commit()
+        logging.info(f"Using report cache file {path}")
+
+    def _write_lookups(self):
+        """Adds the in-memory counts and last-used times to the open transaction; call with _lock held."""
+        self._db.executemany("UPDATE report_cache SET last_used = MAX(last_used, ?) WHERE cache_key = ?",
+                             [(used, key) for key, used in self._used.items()])
+        self._db.executemany("UPDATE cache_stats SET value = value + ? WHERE name = ?",
+                             [(self._hits, 'hits'), (self._misses, 'misses')])
+
+    def _lookups_written(self):
+        self._hits = self._misses = 0
+        self._used.clear()
+        self._flushed = time.monotonic()
+
+    def _flush(self):
+        """Writes the in-memory counts and last-used times; they are kept for the next try if that fails."""
+        try:
+            self._write_lookups()
+            self._db.commit()
+            self._lookups_written()
+        except sqlite3.Error as e:
+            self._db.rollback()
+            logging.warning(f"Report cache stats write failed: {e}")
+
+    def get(self, report, params, generation):
+        """Returns the cached rows, or None if missing, expired or from an older generation."""
+        key = cache_key(report, params)
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT generation, created_at, payload FROM report_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logging.warning(f"Report cache lookup failed: {e}")
+                return None
+            hit = row is not None and row[0] == generation and now - row[1] < self.ttl
+            if hit:
+                self._hits += 1
+                self._used[key] = now
+            else:
+                self._misses += 1
+            if time.monotonic() - self._flushed >= FLUSH_INTERVAL:
+                self._flush()
+        return json.loads(row[2]) if hit else None
+
+    def put(self, report, params, generation, rows):
+        """Caches rows; returns them in the shape get() returns them, even if the write fails."""
+        key = cache_key(report, params)
+        payload = json.dumps(rows, default=str)
+        now = time.time()
+        with self._lock:
+            try:
+                self._write_lookups()
+                self._db.execute(
+                    "INSERT OR REPLACE INTO report_cache VALUES (?, ?, ?, ?, ?)",
+                    (key, generation, now, now, payload)
+                )
+                self._db.execute("""
+                    DELETE FROM report_cache WHERE cache_key IN (
+                        SELECT cache_key FROM report_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+                self._db.commit()
+                self._lookups_written()
+            except sqlite3.Error as e:
+                self._db.rollback()
+                logging.warning(f"Report cache write failed: {e}")
+        return json.loads(payload)
+
+    def stats(self):
+        """Returns hit/miss counts and the number of cached entries."""
+        with self._lock:
+            self._flush()
+            counts = dict(self._db.execute("SELECT name, value FROM cache_stats"))
+            entries = self._db.execute("SELECT COUNT(*) FROM report_cache").fetchone()[0]
+        lookups = counts['hits'] + counts['misses']
+        return {
+            'hits': counts['hits'],
+            'misses': counts['misses'],
+            'hit_ratio': f"{(counts['hits'] / lookups * 100 if lookups else 0):.2f}%",
+            'entries': entries,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM report_cache")
+            self._db.execute("UPDATE cache_stats SET value = 0")
+            self._db.commit()
+            self._lookups_written()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+        self._db.close()
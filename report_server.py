@@ -0,0 +1,203 @@
+# report_server.py
+
+import os
+import gzip
+import json
+import asyncio
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DASHBOARD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard')
+
+# Static dashboard files; index.php is plain HTML
+STATIC_FILES = {
+    '/': ('index.php', 'text/html; charset=utf-8'),
+    '/index.php': ('index.php', 'text/html; charset=utf-8'),
+    '/main.js': ('main.js', 'application/javascript'),
+    '/style.css': ('style.css', 'text/css'),
+}
+
+# Rows in the top IPs / URLs charts, as in reports.php
+TOP_N = 10
+
+# The ?report= names main.js requests: handler method, arguments and the
+# row shape reports.php returned for it
+DASHBOARD_REPORTS = {
+    'top_ips': ('get_top_n_ips', (TOP_N,),
+                lambda row: {'ip_address': row[0], 'request_count': row[1]}),
+    'status_codes': ('get_status_code_distribution', (),
+                     lambda row: {'status_code': row[0], 'count': row[1]}),
+    'os_distribution': ('get_os_distribution', (),
+                        lambda row: {'os': row['os'], 'count': row['requests']}),
+    'hourly_traffic': ('get_hourly_traffic', (),
+                       lambda row: {'hour': row['hour'], 'count': row['request_count']}),
+    'top_urls': ('get_top_n_requested_urls', (TOP_N,),
+                 lambda row: {'path': row['path'], 'count': row['request_count']}),
+}
+
+# Responses smaller than this are not worth compressing
+GZIP_MIN_BYTES = 512
+
+# Seconds an idle keep-alive connection is held open
+KEEP_ALIVE_TIMEOUT = 15
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class Response:
+    """An encoded response body with its ETag and a lazily gzipped copy."""
+
+    def __init__(self, body, content_type='application/json'):
+        self.body = body
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        self._gzipped = None
+
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, compresslevel=6)
+        return self._gzipped
+
+
+class ReportServer:
+    """Serves the dashboard and its `reports.php?report=` JSON endpoints over asyncio.
+
+    Reports run in a thread pool on the handler's pooled connections (and its
+    report cache, if configured). Concurrent requests for the same report share
+    one query, and an unchanged result is answered with 304 Not Modified.
+    """
+
+    def __init__(self, db_handler, host='127.0.0.1', port=8000, workers=4):
+        self.db_handler = db_handler
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self._in_flight = {}    # report -> Future of its Response
+        self._last = {}         # report -> last Response, reused while the body is unchanged
+        self._static = {}
+
+    def _run_report(self, report):
+        name, args, shape = DASHBOARD_REPORTS[report]
+        rows = [shape(row) for row in self.db_handler.pooled_report(name, args)]
+        response = Response(json.dumps(rows, default=str).encode('utf-8'))
+
+        last = self._last.get(report)
+        if last is not None and last.etag == response.etag:
+            return last  # keeps its already gzipped body
+        self._last[report] = response
+        return response
+
+    async def get_report(self, report):
+        """Returns the report's Response; callers arriving while it runs wait for the same query."""
+        future = self._in_flight.get(report)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self.executor, self._run_report, report)
+            self._in_flight[report] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(report, None))
+        return await asyncio.shield(future)
+
+    def _static_file(self, path):
+        if path not in self._static:
+            file_name, content_type = STATIC_FILES[path]
+            with open(os.path.join(DASHBOARD_DIR, file_name), 'rb') as f:
+                self._static[path] = Response(f.read(), content_type)
+        return self._static[path]
+
+    async def _respond(self, method, target, headers):
+        """Returns (status, Response or None) for one request."""
+        if method not in ('GET', 'HEAD'):
+            return 405, Response(json.dumps({'error': 'Method not allowed'}).encode())
+
+        url = urlsplit(target)
+        if url.path in STATIC_FILES:
+            return 200, self._static_file(url.path)
+        if url.path not in ('/reports.php', '/reports'):
+            return 404, Response(json.dumps({'error': 'Not found'}).encode())
+
+        report = parse_qs(url.query).get('report', [None])[0]
+        if report not in DASHBOARD_REPORTS:
+            return 400, Response(json.dumps({'error': 'Invalid report type'}).encode())
+
+        try:
+            response = await self.get_report(report)
+        except Exception as e:
+            logging.error(f"Report {report} failed: {e}")
+            return 500, Response(json.dumps({'error': 'Query failed'}).encode())
+
+        if response.etag in (tag.strip() for tag in headers.get('if-none-match', '').split(',')):
+            return 304, response
+        return 200, response
+
+    async def _write(self, writer, method, status, response, headers, keep_alive):
+        lines = [f"HTTP/1.1 {status} {REASONS[status]}"]
+        body = b''
+        if response is not None:
+            lines.append(f"ETag: {response.etag}")
+            # Browsers revalidate every poll and get a bodiless 304 while nothing changed
+            lines.append("Cache-Control: no-cache")
+            lines.append("Vary: Accept-Encoding")
+            if status != 304:
+                lines.append(f"Content-Type: {response.content_type}")
+                body = response.body
+                if len(body) >= GZIP_MIN_BYTES and 'gzip' in headers.get('accept-encoding', ''):
+                    body = response.gzipped()
+                    lines.append("Content-Encoding: gzip")
+        lines.append(f"Content-Length: {len(body)}")
+        lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if method != 'HEAD':
+            writer.write(body)
+        await writer.drain()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEP_ALIVE_TIMEOUT)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = request_line.split(' ')
+                except ValueError:
+                    break
+                headers = {}
+                for line in header_lines:
+                    if ':' in line:
+                        key, value = line.split(':', 1)
+                        headers[key.strip().lower()] = value.strip()
+
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                status, response = await self._respond(method, target, headers)
+                await self._write(writer, method, status, response, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        logging.info(f"Serving the dashboard on http://{self.host}:{self.port}/")
+        async with server:
+            await server.serve_forever()
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            logging.info("Stopping report server.")
+        finally:
+            self.executor.shutdown()
@@ -0,0 +1,79 @@
+# sketches.py
+
+import heapq
+import math
+
+
+class SpaceSaving:
+    """Space-Saving heavy-hitters summary over a stream of keys.
+
+    Keeps at most `capacity` counters. Every reported count overestimates
+    the true count by at most its `error`, and error <= total / capacity, so
+    capacity = ceil(1 / epsilon) bounds the error at epsilon * total. Two
+    summaries can be merged with the same guarantee over both streams.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        # (count, key) pairs; entries go stale as counts grow and are fixed up lazily
+        self._heap = []
+
+    @classmethod
+    def from_epsilon(cls, epsilon):
+        return cls(math.ceil(1 / epsilon))
+
+    def _pop_min(self):
+        """Removes and returns (key, count) of the smallest counter."""
+        while True:
+            count, key = heapq.heappop(self._heap)
+            current = self.counts[key]
+            if current == count:
+                return key, count
+            heapq.heappush(self._heap, (current, key))
+
+    def add(self, key, count=1):
+        self.total += count
+        if key in self.counts:
+            self.counts[key] += count
+            return
+
+        error = 0
+        if len(self.counts) >= self.capacity:
+            # Replace the smallest counter; the new key inherits its count as error
+            evicted, error = self._pop_min()
+            del self.counts[evicted]
+            del self.errors[evicted]
+        self.counts[key] = error + count
+        self.errors[key] = error
+        heapq.heappush(self._heap, (error + count, key))
+
+    def _floor(self):
+        """Largest count a key missing from a full summary could have."""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0
+
+    def merge(self, other):
+        """Returns a new summary covering both streams."""
+        merged = SpaceSaving(max(self.capacity, other.capacity))
+        floor_self, floor_other = self._floor(), other._floor()
+
+        candidates = []
+        for key in self.counts.keys() | other.counts.keys():
+            count = self.counts.get(key, floor_self) + other.counts.get(key, floor_other)
+            error = self.errors.get(key, floor_self) + other.errors.get(key, floor_other)
+            candidates.append((count, error, key))
+
+        for count, error, key in heapq.nlargest(merged.capacity, candidates, key=lambda c: c[0]):
+            merged.counts[key] = count
+            merged.errors[key] = error
+        merged._heap = [(count, key) for key, count in merged.counts.items()]
+        heapq.heapify(merged._heap)
+        merged.total = self.total + other.total
+        return merged
+
+    def top(self, n):
+        """Returns [(key, count, error)] for the n largest counters."""
+        keys = heapq.nlargest(n, self.counts, key=self.counts.get)
+        return [(key, self.counts[key], self.errors[key]) for key in keys]
@@ -9,7 +9,23 @@ CREATE TABLE IF NOT EXISTS user_agents (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Dimension tables for log_entries.path_id / referrer_id (keyed by MD5 of the value)
+CREATE TABLE IF NOT EXISTS paths (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    path_hash BINARY(16) NOT NULL UNIQUE,
+    path TEXT
+);
+
+CREATE TABLE IF NOT EXISTS referrers (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    referrer_hash BINARY(16) NOT NULL UNIQUE,
+    referrer TEXT
+);
+
 -- Table: log_entries
+-- `python main.py migrate` adds the report indexes and daily partitions, and
+-- replaces path/referrer with path_id/referrer_id and ip_address with VARBINARY(16),
+-- and adds the uniquely keyed row_hash that makes re-ingesting a file a no-op
 CREATE TABLE IF NOT EXISTS log_entries (
     id INT AUTO_INCREMENT PRIMARY KEY,
     ip_address VARCHAR(45),
@@ -23,3 +39,86 @@ CREATE TABLE IF NOT EXISTS log_entries (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_agent_id) REFERENCES user_agents(id)
 );
+
+-- Rollup tables: per-hour request counts maintained at ingest time
+CREATE TABLE IF NOT EXISTS rollup_status (
+    hour_bucket DATETIME,
+    status_code INT,
+    request_count BIGINT UNSIGNED NOT NULL,
+    PRIMARY KEY (hour_bucket, status_code)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_path (
+    hour_bucket DATETIME,
+    path_hash BINARY(16),
+    path TEXT,
+    request_count BIGINT UNSIGNED NOT NULL,
+    PRIMARY KEY (hour_bucket, path_hash)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_ip (
+    hour_bucket DATETIME,
+    ip_address VARCHAR(45),
+    request_count BIGINT UNSIGNED NOT NULL,
+    PRIMARY KEY (hour_bucket, ip_address)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_user_agent (
+    hour_bucket DATETIME,
+    user_agent_id INT,
+    request_count BIGINT UNSIGNED NOT NULL,
+    PRIMARY KEY (hour_bucket, user_agent_id)
+);
+
+-- Table: ingest_checkpoints (committed read position of each followed log)
+CREATE TABLE IF NOT EXISTS ingest_checkpoints (
+    file_path VARCHAR(512) PRIMARY KEY,
+    inode BIGINT UNSIGNED,
+    byte_offset BIGINT UNSIGNED,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Table: ingest_runs (one row per process_logs run)
+CREATE TABLE IF NOT EXISTS ingest_runs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    status VARCHAR(16) NOT NULL,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP NULL
+);
+
+-- Table: ingest_manifest (byte range, row count and checksum of every committed batch,
+-- by the SHA-1 of the file's first line; process_logs --resume skips these ranges)
+CREATE TABLE IF NOT EXISTS ingest_manifest (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    run_id INT,
+    fingerprint BINARY(20) NOT NULL,
+    file_path VARCHAR(512),
+    start_offset BIGINT UNSIGNED NOT NULL,
+    end_offset BIGINT UNSIGNED NOT NULL,
+    row_count INT UNSIGNED NOT NULL,
+    new_rows INT UNSIGNED NOT NULL,
+    checksum BIGINT UNSIGNED NOT NULL,
+    committed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_fingerprint (fingerprint, start_offset),
+    INDEX idx_run (run_id)
+);
+
+-- Table: anomalies (alerts from the streaming anomaly detector, --detect_anomalies)
+CREATE TABLE IF NOT EXISTS anomalies (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    detected_at DATETIME NOT NULL,
+    minute DATETIME NOT NULL,
+    kind VARCHAR(32) NOT NULL,
+    subject VARCHAR(2048),
+    value DOUBLE NOT NULL,
+    baseline DOUBLE NULL,
+    requests INT UNSIGNED NOT NULL,
+    INDEX idx_minute (minute),
+    INDEX idx_kind_minute (kind, minute)
+);
+
+-- Table: ingest_generation (bumped by every ingest; invalidates cached reports)
+CREATE TABLE IF NOT EXISTS ingest_generation (
+    id TINYINT PRIMARY KEY,
+    generation BIGINT UNSIGNED NOT NULL
+);
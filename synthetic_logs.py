@@ -0,0 +1,207 @@
+# synthetic_logs.py
+
+import gzip
+import random
+import argparse
+import itertools
+import time
+from array import array
+from datetime import datetime, timezone
+from multiprocessing import Pool
+from operator import itemgetter
+
+# Lines drawn, formatted and written at a time
+CHUNK_LINES = 100000
+
+# Columns with at most TABLE_MAX_VALUES values are drawn through a lookup table
+# of TABLE_SLOTS entries indexed by random 16-bit integers, all in C; larger
+# ones through random.choices
+TABLE_SLOTS = 65536
+TABLE_MAX_VALUES = 4096
+
+# Default value pool sizes; requests per value follow a Zipf law with exponent skew
+DEFAULT_IPS = 50000
+DEFAULT_PATHS = 5000
+DEFAULT_USER_AGENTS = 2000
+DEFAULT_REFERRERS = 500
+DEFAULT_SKEW = 1.1
+
+METHODS = (['GET', 'POST', 'PUT', 'DELETE', 'HEAD'], [85, 10, 2, 1, 2])
+STATUS_CODES = ([200, 304, 302, 404, 403, 500, 503], [70, 8, 4, 10, 3, 4, 1])
+PROTOCOLS = (['HTTP/1.1', 'HTTP/2', 'HTTP/1.0'], [60, 38, 2])
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+_SECTIONS = ['products', 'api/v1/items', 'blog', 'static/js', 'static/css', 'images', 'account', 'search', 'docs']
+_EXTENSIONS = ['', '.html', '.json', '.js', '.css', '.png', '.jpg', '']
+_USER_AGENT_TEMPLATES = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.{b}.{p} Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_{m}) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/{m}.{p} Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:{v}.0) Gecko/20100101 Firefox/{v}.0',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS {m}_{p} like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E{b}',
+    'Mozilla/5.0 (Linux; Android {m}; SM-A{b}F) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{v}.0.{b}.{p} Mobile Safari/537.36',
+    'Mozilla/5.0 (compatible; Googlebot/2.{m}; +http://www.google.com/bot.html)',
+    'curl/7.{v}.{p}',
+    'python-requests/2.{v}.{p}',
+]
+
+
+def zipf_cum_weights(n, skew):
+    """Cumulative weights of ranks 1..n under a Zipf law; skew 0 is uniform."""
+    return list(itertools.accumulate(1 / rank ** skew for rank in range(1, n + 1)))
+
+
+class _Column:
+    """Draws values of one column with the given cumulative weights (uniform if None)."""
+
+    def __init__(self, values, cum_weights=None):
+        self.values = values
+        self.cum_weights = cum_weights
+        self.table = None
+        if len(values) <= TABLE_MAX_VALUES:
+            # Each value fills slots in proportion to its weight, and at least one
+            weights = [1] * len(values) if cum_weights is None else \
+                [b - a for a, b in zip([0] + cum_weights[:-1], cum_weights)]
+            total = sum(weights)
+            slots = [max(1, int(weight / total * TABLE_SLOTS)) for weight in weights]
+            slots[0] += TABLE_SLOTS - sum(slots)
+            self.table = [value for value, count in zip(values, slots) for _ in range(count)]
+
+    def draw(self, rng, k):
+        if self.table is None:
+            return rng.choices(self.values, cum_weights=self.cum_weights, k=k)
+        if k == 1:
+            return [self.table[rng.getrandbits(16)]]
+        return itemgetter(*array('H', rng.randbytes(2 * k)))(self.table)
+
+
+def _timestamps(seconds):
+    """Formats epoch seconds as log timestamps, each distinct second once."""
+    formatted = {}
+    for second in dict.fromkeys(seconds):
+        dt = datetime.fromtimestamp(second, tz=timezone.utc)
+        formatted[second] = (f"{dt.day:02d}/{MONTHS[dt.month - 1]}/{dt.year}:"
+                             f"{dt.hour:02d}:{dt.minute:02d}:{dt.second:02d} +0000")
+    return [formatted[second] for second in seconds]
+
+
+# Generator shared with the pool's worker processes
+_worker_generator = None
+
+
+def _init_worker(generator):
+    global _worker_generator
+    _worker_generator = generator
+
+
+def _worker_chunk(task):
+    return _worker_generator.chunk(*task)
+
+
+class SyntheticLogs:
+    """Combined Log Format lines with configurable value cardinalities and skew.
+
+    Every column of a chunk is drawn in one call and the chunk is formatted
+    in one pass, so millions of lines take seconds rather than the per-line
+    Faker calls of generate_realistic_logs.py. Each chunk has its own seed,
+    so a file is the same for a given seed however many workers write it.
+    Timestamps rise evenly over the days from start.
+    """
+
+    def __init__(self, ips=DEFAULT_IPS, paths=DEFAULT_PATHS, user_agents=DEFAULT_USER_AGENTS,
+                 referrers=DEFAULT_REFERRERS, skew=DEFAULT_SKEW, start=datetime(2025, 7, 25), days=7,
+                 malformed=0.0, seed=42):
+        rng = random.Random(seed)
+        self.seed = seed
+        self.start = int(start.replace(tzinfo=timezone.utc).timestamp())
+        self.seconds = days * 86400
+        self.malformed = malformed
+
+        ip_values = list(dict.fromkeys(
+            f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+            for _ in range(ips)
+        ))
+        path_values = [f"/{rng.choice(_SECTIONS)}/{i}{rng.choice(_EXTENSIONS)}" for i in range(paths)]
+        user_agent_values = [
+            rng.choice(_USER_AGENT_TEMPLATES).format(v=rng.randint(20, 130), b=rng.randint(100, 9999),
+                                                     p=rng.randint(0, 200), m=rng.randint(5, 17)) + f" {i}"
+            for i in range(user_agents)
+        ]
+        referrer_values = ['-'] + [f"https://site{i}.example.com/{rng.choice(_SECTIONS)}" for i in range(referrers)]
+
+        self.ips = _Column(ip_values, zipf_cum_weights(len(ip_values), skew))
+        self.paths = _Column(path_values, zipf_cum_weights(len(path_values), skew))
+        self.user_agents = _Column(user_agent_values, zipf_cum_weights(len(user_agent_values), skew))
+        self.referrers = _Column(referrer_values, zipf_cum_weights(len(referrer_values), skew))
+        self.methods = _Column(METHODS[0], list(itertools.accumulate(METHODS[1])))
+        self.statuses = _Column(STATUS_CODES[0], list(itertools.accumulate(STATUS_CODES[1])))
+        self.protocols = _Column(PROTOCOLS[0], list(itertools.accumulate(PROTOCOLS[1])))
+        self.sizes = _Column([int(rng.lognormvariate(8, 1.2)) for _ in range(4096)])
+
+    def chunk(self, index, first, k, step):
+        """Returns the text of lines first..first + k - 1, drawn from the chunk's own seed."""
+        rng = random.Random(self.seed * 1000003 + index)
+        columns = [column.draw(rng, k) for column in (self.ips, self.methods, self.paths, self.protocols,
+                                                       self.statuses, self.sizes, self.referrers, self.user_agents)]
+        timestamps = _timestamps([self.start + int((first + i) * step) for i in range(k)])
+
+        text = [
+            f'{ip} - - [{ts}] "{method} {path} {protocol}" {status} {size} "{referrer}" "{user_agent}"\n'
+            for ip, ts, method, path, protocol, status, size, referrer, user_agent
+            in zip(columns[0], timestamps, *columns[1:])
+        ]
+        if self.malformed:
+            for i in rng.sample(range(k), int(k * self.malformed)):
+                text[i] = text[i][:rng.randint(0, len(text[i]) - 2)] + '\n'
+        return ''.join(text)
+
+    def chunks(self, lines, workers=1, chunk_lines=CHUNK_LINES):
+        """Yields the text of lines log lines in order, chunk_lines at a time, formatted in workers processes."""
+        step = self.seconds / max(lines, 1)
+        tasks = [(index, first, min(chunk_lines, lines - first), step)
+                 for index, first in enumerate(range(0, lines, chunk_lines))]
+        if workers <= 1:
+            for task in tasks:
+                yield self.chunk(*task)
+            return
+        with Pool(processes=workers, initializer=_init_worker, initargs=(self,)) as pool:
+            yield from pool.imap(_worker_chunk, tasks)
+
+    def write(self, file_path, lines, workers=1):
+        """Writes lines log lines to file_path, gzip-compressed if it ends in .gz; returns the bytes written."""
+        opener = gzip.open if file_path.endswith('.gz') else open
+        written = 0
+        with opener(file_path, 'wt', encoding='utf-8', newline='\n') as f:
+            for chunk in self.chunks(lines, workers):
+                f.write(chunk)
+                written += len(chunk)
+        return written
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Write a synthetic Combined Log Format file")
+    arg_parser.add_argument('file_path', help='Output file (.gz to compress)')
+    arg_parser.add_argument('--lines', type=int, default=1000000, help='Lines to write')
+    arg_parser.add_argument('--ips', type=int, default=DEFAULT_IPS, help='Distinct client IPs')
+    arg_parser.add_argument('--paths', type=int, default=DEFAULT_PATHS, help='Distinct request paths')
+    arg_parser.add_argument('--user_agents', type=int, default=DEFAULT_USER_AGENTS, help='Distinct user agents')
+    arg_parser.add_argument('--referrers', type=int, default=DEFAULT_REFERRERS, help='Distinct referrers')
+    arg_parser.add_argument('--skew', type=float, default=DEFAULT_SKEW,
+                            help='Zipf exponent of IP/path/UA/referrer popularity (0 = uniform)')
+    arg_parser.add_argument('--days', type=int, default=7, help='Days the timestamps span, from 2025-07-25')
+    arg_parser.add_argument('--malformed', type=float, default=0.0, help='Fraction of truncated lines')
+    arg_parser.add_argument('--seed', type=int, default=42, help='Random seed')
+    arg_parser.add_argument('--workers', type=int, default=1, help='Format chunks in N processes')
+    args = arg_parser.parse_args()
+
+    started = time.perf_counter()
+    generator = SyntheticLogs(args.ips, args.paths, args.user_agents, args.referrers, args.skew,
+                              days=args.days, malformed=args.malformed, seed=args.seed)
+    written = generator.write(args.file_path, args.lines, args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"Wrote {args.lines} lines ({written / 1048576:.1f} MB) to {args.file_path} in {elapsed:.2f}s "
+          f"({args.lines / elapsed:.0f} lines/sec)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# ua_classifier.py
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from user_agents import parse as parse_ua
+from lru_cache import LRUCache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Classifications kept in memory in front of the cache file
+MEMORY_CACHE_SIZE = 100000
+
+# Uncached user agents needed in one call before the process pool is used
+POOL_THRESHOLD = 500
+
+
+def classify_user_agent(user_agent_str):
+    """Returns (os, browser, device_type) for a user agent string."""
+    parsed_ua = parse_ua(user_agent_str)
+    device_type = "Mobile" if parsed_ua.is_mobile else \
+                  "Tablet" if parsed_ua.is_tablet else \
+                  "PC" if parsed_ua.is_pc else \
+                  "Bot" if parsed_ua.is_bot else "Other"
+    return parsed_ua.os.family, parsed_ua.browser.family, device_type
+
+
+def _ua_hash(user_agent_str):
+    return hashlib.sha1(user_agent_str.encode('utf-8')).hexdigest()
+
+
+class UserAgentClassifier:
+    """Memoises user agent classification in memory and in an optional sqlite cache file.
+
+    The cache file is keyed by a SHA-1 of the user agent string, so it can be
+    copied to other hosts to start them warm. With workers > 0, large cold
+    batches are classified in a process pool. One classifier is shared by
+    every writer thread, so the sqlite connection and the pool's creation
+    are each guarded by a lock.
+    """
+
+    def __init__(self, cache_path=None, workers=0):
+        self.memory = LRUCache(MEMORY_CACHE_SIZE)
+        self.workers = workers
+        self._pool = None
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+
+        if cache_path:
+            try:
+                self._db = sqlite3.connect(cache_path, check_same_thread=False)
+                self._db.execute("""
+                    CREATE TABLE IF NOT EXISTS ua_classification (
+                        ua_hash TEXT PRIMARY KEY,
+                        os TEXT,
+                        browser TEXT,
+                        device_type TEXT
+                    )
+                """)
+                self._db.commit()
+                logging.info(f"Using user agent cache file {cache_path}")
+            except sqlite3.Error as e:
+                logging.warning(f"User agent cache file unavailable, using memory only: {e}")
+                self._db = None
+
+    def _load_from_file(self, user_agents):
+        """Returns {ua: classification} for the user agents already in the cache file."""
+        found = {}
+        if self._db is None:
+            return found
+
+        hashes = {_ua_hash(ua): ua for ua in user_agents}
+        keys = list(hashes)
+        with self._db_lock:
+            try:
+                # Stay well below sqlite's bound-parameter limit
+                for i in range(0, len(keys), 500):
+                    chunk = keys[i:i + 500]
+                    rows = self._db.execute(
+                        f"SELECT ua_hash, os, browser, device_type FROM ua_classification "
+                        f"WHERE ua_hash IN ({', '.join(['?'] * len(chunk))})",
+                        chunk
+                    )
+                    for ua_hash, os, browser, device_type in rows:
+                        found[hashes[ua_hash]] = (os, browser, device_type)
+            except sqlite3.Error as e:
+                logging.warning(f"User agent cache lookup failed: {e}")
+        return found
+
+    def _save_to_file(self, classified):
+        if self._db is None or not classified:
+            return
+        rows = [(_ua_hash(ua), *result) for ua, result in classified.items()]
+        with self._db_lock:
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO ua_classification VALUES (?, ?, ?, ?)", rows)
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"User agent cache write failed: {e}")
+
+    def _classify_uncached(self, user_agents):
+        if self.workers > 0 and len(user_agents) >= POOL_THRESHOLD:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            chunksize = max(1, len(user_agents) // (self.workers * 4))
+            results = self._pool.map(classify_user_agent, user_agents, chunksize=chunksize)
+            return dict(zip(user_agents, results))
+        return {ua: classify_user_agent(ua) for ua in user_agents}
+
+    def classify_many(self, user_agent_strings):
+        """Returns {ua: (os, browser, device_type)} for the distinct strings given."""
+        results, missing = {}, []
+
+        for ua in set(user_agent_strings):
+            cached = self.memory.get(ua)
+            if cached is None:
+                missing.append(ua)
+            else:
+                results[ua] = cached
+
+        if missing:
+            from_file = self._load_from_file(missing)
+            missing = [ua for ua in missing if ua not in from_file]
+            classified = self._classify_uncached(missing) if missing else {}
+            self._save_to_file(classified)
+
+            for ua, result in {**from_file, **classified}.items():
+                self.memory.put(ua, result)
+                results[ua] = result
+
+            if classified:
+                logging.info(f"Classified {len(classified)} new user agents "
+                             f"({len(from_file)} loaded from cache file).")
+
+        return results
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None